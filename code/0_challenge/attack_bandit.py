@@ -0,0 +1,112 @@
+"""
+Adaptive attack budget allocation over (risk category, attack strategy) arms.
+
+A fixed num_objectives per risk category spends as much on strategies that
+never get through as on the ones that nearly always do. In adaptive mode the
+red team scan runs in rounds: every round the bandit splits the round's attack
+objectives across the arms, the sub-scans run, and the observed attack
+successes update the arms before the next round.
+
+- Thompson sampling draws each objective's arm from the Beta posterior of the
+  arms' attack success rates
+- UCB1 gives each objective to the arm with the highest upper confidence bound
+  (the arms' pull counts are bumped while a round is being allocated, so one
+  round does not go entirely to a single arm)
+
+A share of every round (the exploration floor) is handed out round-robin over
+all arms first, so no arm is starved because of a few unlucky early attacks.
+"""
+
+import math
+import random
+from typing import Optional
+
+BANDIT_METHODS = ("thompson", "ucb")
+
+DEFAULT_EXPLORATION_FLOOR = 0.2
+
+
+class AttackBandit:
+    """Per-arm attack and success counts and the budget allocation derived from them."""
+
+    def __init__(
+        self,
+        arms: list[str],
+        method: str = "thompson",
+        exploration_floor: float = DEFAULT_EXPLORATION_FLOOR,
+        seed: Optional[int] = None,
+    ):
+        if method not in BANDIT_METHODS:
+            raise ValueError(f"Invalid bandit method {method!r}, expected one of {', '.join(BANDIT_METHODS)}")
+        if not 0 <= exploration_floor <= 1:
+            raise ValueError(f"Exploration floor must be between 0 and 1, got {exploration_floor}")
+        self.arms = list(arms)
+        self.method = method
+        self.exploration_floor = exploration_floor
+        self._random = random.Random(seed)
+        self._cursor = 0
+        self.objectives = {arm: 0 for arm in self.arms}
+        self.attacks = {arm: 0 for arm in self.arms}
+        self.successes = {arm: 0 for arm in self.arms}
+        self.rounds: list[dict[str, int]] = []
+
+    def _thompson(self, pulls: dict[str, int]) -> str:
+        draws = {
+            arm: self._random.betavariate(1 + self.successes[arm], 1 + self.attacks[arm] - self.successes[arm])
+            for arm in self.arms
+        }
+        return max(draws, key=draws.get)
+
+    def _ucb(self, pulls: dict[str, int]) -> str:
+        total = sum(pulls.values())
+        untried = [arm for arm in self.arms if pulls[arm] == 0]
+        if untried:
+            return untried[0]
+
+        def bound(arm: str) -> float:
+            mean = self.successes[arm] / self.attacks[arm] if self.attacks[arm] else 0.0
+            return mean + math.sqrt(2 * math.log(total) / pulls[arm])
+
+        return max(self.arms, key=bound)
+
+    def allocate(self, budget: int) -> dict[str, int]:
+        """Split a round's attack objectives across the arms."""
+        allocation = {arm: 0 for arm in self.arms}
+        floor = min(budget, math.ceil(budget * self.exploration_floor))
+        for step in range(floor):
+            allocation[self.arms[(self._cursor + step) % len(self.arms)]] += 1
+        # Rotate, so the next round's floor starts with the arms this one did not reach
+        self._cursor = (self._cursor + floor) % len(self.arms)
+
+        # Objectives handed out so far, including this round's; UCB's exploration bonus shrinks with them
+        pulls = {arm: self.objectives[arm] + allocation[arm] for arm in self.arms}
+        choose = self._thompson if self.method == "thompson" else self._ucb
+        for _ in range(budget - floor):
+            arm = choose(pulls)
+            allocation[arm] += 1
+            pulls[arm] += 1
+        self.rounds.append({arm: count for arm, count in allocation.items() if count})
+        return allocation
+
+    def update(self, arm: str, objectives: int, attacks: int, successes: int) -> None:
+        """Record the outcome of an arm's sub-scan (attacks with a known outcome and how many succeeded)."""
+        self.objectives[arm] += objectives
+        self.attacks[arm] += attacks
+        self.successes[arm] += successes
+
+    def report(self) -> dict:
+        arms = {
+            arm: {
+                "objectives": self.objectives[arm],
+                "attacks": self.attacks[arm],
+                "successes": self.successes[arm],
+                "asr": round(self.successes[arm] / self.attacks[arm], 3) if self.attacks[arm] else None,
+            }
+            for arm in self.arms
+        }
+        return {
+            "method": self.method,
+            "exploration_floor": self.exploration_floor,
+            "arms": dict(sorted(arms.items(), key=lambda item: -(item[1]["asr"] or 0))),
+            "rounds": self.rounds,
+        }
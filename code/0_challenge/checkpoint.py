@@ -0,0 +1,131 @@
+"""
+Checkpoint journal for resumable evaluation runs.
+
+evaluate() only writes results_target.jsonl once every row is done, so a run that
+dies near the end (expired token, backend restart) loses all of its work. In
+resumable mode every completed unit of work is appended to a JSONL journal as
+soon as it finishes:
+
+    {"key": "<row hash>", "kind": "target", "payload": {...RagResponse...}}
+    {"key": "<row hash>", "kind": "relevance", "payload": {...evaluator result...}}
+
+Target outputs are keyed by a hash of the question and evaluator results by a
+hash of the evaluator name and its inputs. On restart the target and the
+evaluators answer finished rows straight from the journal, so evaluate() walks
+the whole file again but only unfinished rows cost backend or judge calls, and
+the final output and metrics are produced exactly as in an uninterrupted run.
+Failed rows (backend errors, NaN judge scores) are not journaled and are retried.
+
+Each record is written with a single append followed by fsync, so the journal
+can be shared by evaluate()'s worker processes and survives a crash.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from evaluator_wrapper import EvaluatorWrapper
+from judge_cache import is_failed_result
+
+# Environment variable pointing worker processes at the journal of the current run
+CHECKPOINT_ENV_VAR = "EVAL_CHECKPOINT_PATH"
+
+_journals: dict[str, "CheckpointJournal"] = {}
+_journals_lock = threading.Lock()
+
+
+def row_key(*parts) -> str:
+    """Hash the identity of a unit of work (question, or evaluator name plus inputs)."""
+    material = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CheckpointJournal:
+    """Append-only journal of completed targets and evaluator results for one run."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], dict] = {}
+        self.resumed = 0
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be cut short if the previous run died mid-write
+                        continue
+                    self._entries[(record["kind"], record["key"])] = record["payload"]
+            self.resumed = len(self._entries)
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._entries.get((kind, key))
+
+    def record(self, kind: str, key: str, payload: dict) -> None:
+        """Append a finished unit of work and flush it to disk."""
+        line = json.dumps({"key": key, "kind": kind, "payload": payload}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._entries[(kind, key)] = payload
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return sum(1 for entry_kind, _ in self._entries if entry_kind == kind)
+
+    def publish_env(self) -> None:
+        """Expose this journal to worker processes started from now on."""
+        os.environ[CHECKPOINT_ENV_VAR] = str(self.path)
+
+
+def get_checkpoint(path: Optional[str] = None) -> Optional[CheckpointJournal]:
+    """
+    Return the process-wide journal for a path (defaults to the one published
+    through CHECKPOINT_ENV_VAR), or None when the run is not resumable.
+    """
+    path = path or os.getenv(CHECKPOINT_ENV_VAR)
+    if not path:
+        return None
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = CheckpointJournal(Path(path))
+            _journals[path] = journal
+        return journal
+
+
+class CheckpointedEvaluator(EvaluatorWrapper):
+    """
+    Wrap an evaluator so finished rows are answered from the checkpoint journal
+    and every new result is journaled as soon as it is computed.
+
+    Only the journal path is stored, so the wrapper can be pickled into worker
+    processes; each process opens the journal on first use.
+    """
+
+    def __init__(self, evaluator: Callable, name: str, journal_path: Path):
+        super().__init__(evaluator)
+        self.name = name
+        self.journal_path = str(journal_path)
+
+    def evaluate(self, inputs: dict[str, str]) -> Any:
+        journal = get_checkpoint(self.journal_path)
+        key = row_key(self.name, inputs.get("query"), inputs.get("response"), inputs.get("context"))
+        finished = journal.get(self.name, key)
+        if finished is not None:
+            return finished
+
+        result = self.evaluator(**inputs)
+        if not is_failed_result(result):
+            journal.record(self.name, key, result)
+        return result
@@ -0,0 +1,254 @@
+"""
+Optional Parquet storage for simulation data and safety results.
+
+simulation_data.jsonl and safety_results.jsonl are plain JSON that every later
+step re-parses in full. With --output-format parquet the safety evaluation script
+also writes them as Parquet (zstd compressed) next to the JSON files:
+
+    simulation_data.parquet   one row per simulated query/response
+    safety_results.parquet    one row per (simulated row, harm category), sorted by
+                              category and score, so filters on category and
+                              severity skip whole row groups
+    safety_metrics.parquet    one row per summarized metric
+
+The readers memory-map the files and push category/severity predicates down to
+the Parquet reader, so only matching row groups are decoded. Existing JSONL
+artifacts can be converted with:
+
+    python evals/columnar.py convert evals/redteam_results/simulation_data.jsonl
+    python evals/columnar.py convert evals/safety_results.jsonl
+
+Requires pyarrow (pip install pyarrow), which is only imported when used.
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+from typing import Iterable, Optional
+
+OUTPUT_FORMATS = ("jsonl", "parquet")
+
+# Harm categories reported by ContentSafetyEvaluator, in the order they are written
+HARM_CATEGORIES = ("violence", "sexual", "self_harm", "hate_unfairness")
+
+# Rows per Parquet row group; smaller groups make predicate pushdown more selective
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def require_pyarrow():
+    """Import pyarrow, or fail with an installation hint."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet output requires pyarrow. Install it with "pip install pyarrow".') from None
+    return pyarrow, pyarrow.parquet
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+        return float(value)
+    return None
+
+
+def safety_long_rows(rows: list[dict]) -> Iterable[dict]:
+    """Reshape evaluate()-style safety rows into one record per (row, harm category)."""
+    for row_id, row in enumerate(rows):
+        inputs = {name.removeprefix("inputs."): value for name, value in row.items() if name.startswith("inputs.")}
+        for category in HARM_CATEGORIES:
+            if f"outputs.safety.{category}_score" not in row and f"outputs.safety.{category}" not in row:
+                continue
+            yield {
+                "row_id": row_id,
+                "query": inputs.get("query"),
+                "response": inputs.get("response"),
+                "scenario": inputs.get("scenario"),
+                "conversation_id": inputs.get("conversation_id"),
+                "turn": inputs.get("turn"),
+                "category": category,
+                "severity": row.get(f"outputs.safety.{category}"),
+                "score": _number(row.get(f"outputs.safety.{category}_score")),
+                "reason": row.get(f"outputs.safety.{category}_reason"),
+            }
+
+
+def _safety_schema():
+    pa, _ = require_pyarrow()
+    return pa.schema(
+        [
+            ("row_id", pa.int64()),
+            ("query", pa.string()),
+            ("response", pa.string()),
+            ("scenario", pa.string()),
+            ("conversation_id", pa.string()),
+            ("turn", pa.int64()),
+            ("category", pa.string()),
+            ("severity", pa.string()),
+            ("score", pa.float64()),
+            ("reason", pa.string()),
+        ]
+    )
+
+
+def write_safety_results(result: dict, results_path: Path, metrics_path: Optional[Path] = None) -> None:
+    """Write an evaluate()-style safety result as long-format Parquet (plus its metrics)."""
+    pa, pq = require_pyarrow()
+    table = pa.Table.from_pylist(list(safety_long_rows(result.get("rows", []))), schema=_safety_schema())
+    # Sorting clusters each category and severity range into few row groups, which makes pushdown effective
+    table = table.sort_by([("category", "ascending"), ("score", "ascending")])
+    pq.write_table(table, results_path, compression="zstd", row_group_size=ROW_GROUP_SIZE)
+    if metrics_path is not None:
+        metrics = [
+            {"metric": name, "value": _number(value)} for name, value in result.get("metrics", {}).items()
+        ]
+        pq.write_table(
+            pa.Table.from_pylist(metrics, schema=pa.schema([("metric", pa.string()), ("value", pa.float64())])),
+            metrics_path,
+            compression="zstd",
+        )
+
+
+# Column types of simulation_data rows; other columns are inferred from the first chunk
+SIMULATION_COLUMN_TYPES = {
+    "query": "string",
+    "response": "string",
+    "scenario": "string",
+    "conversation_id": "string",
+    "turn": "int64",
+    "ttft": "float64",
+    "total_time": "float64",
+}
+
+
+def write_simulation_data(jsonl_path: Path, parquet_path: Path, chunk_rows: int = ROW_GROUP_SIZE) -> int:
+    """
+    Convert a simulation_data.jsonl file to Parquet in chunks (constant memory).
+
+    Returns:
+        The number of rows written
+    """
+    pa, pq = require_pyarrow()
+    writer = None
+    schema = None
+    written = 0
+    chunk: list[dict] = []
+
+    def flush():
+        nonlocal writer, schema, written
+        if schema is None:
+            fields = []
+            for field in pa.Table.from_pylist(chunk).schema:
+                if field.name in SIMULATION_COLUMN_TYPES:
+                    field = field.with_type(pa.type_for_alias(SIMULATION_COLUMN_TYPES[field.name]))
+                elif pa.types.is_null(field.type):
+                    # A column that is null in the whole first chunk can't be typed; store it as text
+                    field = field.with_type(pa.string())
+                fields.append(field)
+            schema = pa.schema(fields)
+            writer = pq.ParquetWriter(parquet_path, schema, compression="zstd")
+        writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        written += len(chunk)
+        chunk.clear()
+
+    try:
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    chunk.append(json.loads(line))
+                    if len(chunk) >= chunk_rows:
+                        flush()
+        if chunk:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # Keep an empty but valid file for runs that produced no rows
+        pq.write_table(pa.schema([("query", pa.string()), ("response", pa.string())]).empty_table(), parquet_path)
+    return written
+
+
+def read_simulation_data(path: Path, columns: Optional[list[str]] = None, scenarios: Optional[list[str]] = None):
+    """Memory-map simulation data, optionally only some columns and scenarios. Returns a pyarrow Table."""
+    _, pq = require_pyarrow()
+    filters = [("scenario", "in", scenarios)] if scenarios else None
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+
+def read_safety_results(
+    path: Path,
+    categories: Optional[list[str]] = None,
+    min_score: Optional[float] = None,
+    severities: Optional[list[str]] = None,
+    columns: Optional[list[str]] = None,
+):
+    """
+    Memory-map long-format safety results, pushing the filters down to the Parquet reader.
+
+    Args:
+        path: safety_results.parquet file (or a directory of them)
+        categories: Only these harm categories (e.g. ["violence"])
+        min_score: Only rows with a severity score of at least this value (0-7)
+        severities: Only these severity labels (e.g. ["Medium", "High"])
+        columns: Only load these columns
+
+    Returns:
+        A pyarrow Table (call .to_pandas() for a DataFrame)
+    """
+    _, pq = require_pyarrow()
+    filters = []
+    if categories:
+        filters.append(("category", "in", categories))
+    if min_score is not None:
+        filters.append(("score", ">=", min_score))
+    if severities:
+        filters.append(("severity", "in", severities))
+    return pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+
+def convert(jsonl_path: Path, output_path: Optional[Path] = None) -> Path:
+    """Convert an existing simulation_data.jsonl or safety_results.jsonl file to Parquet."""
+    output_path = output_path or jsonl_path.with_suffix(".parquet")
+    with open(jsonl_path, encoding="utf-8") as f:
+        first_line = f.readline()
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        # evaluate() output is a single (usually pretty-printed) JSON document, not one row per line
+        first = None
+    if first is not None and "query" in first:
+        rows = write_simulation_data(jsonl_path, output_path)
+        print(f"✅ Converted {rows} simulation rows to {output_path}")
+        return output_path
+
+    with open(jsonl_path, encoding="utf-8") as f:
+        result = json.load(f)
+    metrics_path = output_path.with_name(output_path.stem.replace("results", "metrics") + ".parquet")
+    if metrics_path == output_path:
+        metrics_path = output_path.with_name(output_path.stem + "_metrics.parquet")
+    write_safety_results(result, output_path, metrics_path)
+    print(f"✅ Converted {len(result.get('rows', []))} safety result rows to {output_path} (metrics: {metrics_path})")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert and query Parquet safety artifacts.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert a JSONL artifact to Parquet.")
+    convert_parser.add_argument("path", type=Path, help="simulation_data.jsonl or safety_results.jsonl file.")
+    convert_parser.add_argument("--output", type=Path, default=None, help="Parquet file to write.")
+
+    query_parser = subparsers.add_parser("query", help="Print matching rows of a safety_results.parquet file.")
+    query_parser.add_argument("path", type=Path, help="safety_results.parquet file or directory.")
+    query_parser.add_argument("--category", action="append", choices=HARM_CATEGORIES, help="Harm category (repeatable).")
+    query_parser.add_argument("--min-score", type=float, default=None, help="Minimum severity score (0-7).")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert(args.path, args.output)
+    else:
+        table = read_safety_results(args.path, categories=args.category, min_score=args.min_score)
+        print(f"{table.num_rows} matching rows")
+        print(table.select(["row_id", "category", "severity", "score", "query"]).to_pandas().head(20))
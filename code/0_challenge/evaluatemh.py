@@ -6,76 +6,70 @@
 # ----------------------------------------------
 
 import os
+import json
 import pandas as pd
-import requests
+import httpx
 from pathlib import Path
-from typing import TypedDict
 from pprint import pprint
+from checkpoint import CheckpointedEvaluator, get_checkpoint
+from http_pool import get_client
+from judge_cache import CachedEvaluator, JudgeCache
+from rate_limit import RateLimitedEvaluator, get_limiter
+from response_cache import CACHE_MODE_ENV_VAR, CACHE_MODES, ResponseCache
+from sharding import shard_dir, write_shard
+from target_runner import (
+    DEFAULT_CONCURRENCY,
+    RagResponse,
+    ask,
+    error_rag_response,
+    get_cached,
+    get_prefetched,
+    performance_summary,
+    prefetch_targets,
+    record_finished,
+    store_cached,
+)
 
 # ----------------------------------------------
 # 1. Define Target Function to Query RAG App
 # ----------------------------------------------
 
-class RagResponse(TypedDict):
-    """Response structure from RAG application evaluation."""
-    response: str
-    context: str
-
 def evaluate_rag_application(question: str) -> RagResponse:
     """
     Target function that calls the RAG application backend API.
     This function will be evaluated by the Azure AI evaluation SDK.
+    Answers prefetched concurrently by target_runner (or found in the response
+    cache) are served without a backend call.
     
     Args:
         question: The user question to ask the RAG application
         
     Returns:
-        RagResponse with response and context for evaluation
+        RagResponse with response, context and request metrics for evaluation
     """
+    prefetched = get_prefetched(question)
+    if prefetched is not None:
+        return prefetched
+    
     # Read BACKEND_URL from environment each time to support multiprocessing
     backend_url = os.getenv("BACKEND_URI", "http://localhost:50505")
     
+    url = f"{backend_url}/chat"
+    cached = get_cached(url, question)
+    if cached is not None:
+        return cached
+    
     try:
         # Call the /chat endpoint of the RAG application
-        response = requests.post(
-            f"{backend_url}/chat",
-            json={
-                "messages": [{"content": question, "role": "user"}],
-                "context": {
-                    "overrides": {
-                        "retrieval_mode": "hybrid",
-                        "semantic_ranker": True,
-                        "semantic_captions": False,
-                        "top": 3,
-                        "suggest_followup_questions": False,
-                    }
-                }
-            },
-            headers={"Content-Type": "application/json"},
-            timeout=60
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Extract the answer and context from the response
-        answer = result.get("message", {}).get("content", "")
-        data_points = result.get("context", {}).get("data_points", {}).get("text", [])
+        # (answer, context, latency, TTFB, status and payload size are extracted from the response)
+        result = ask(url, question, timeout=60)
+        store_cached(url, question, result)
+        record_finished(question, result)
+        return result
         
-        # Format context as string for groundedness evaluation
-        context = "\n\n".join(data_points) if data_points else ""
-        
-        return RagResponse(
-            response=answer,
-            context=context
-        )
-        
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
         print(f"Error calling RAG application: {e}")
-        return RagResponse(
-            response=f"Error: {str(e)}",
-            context=""
-        )
+        return error_rag_response(e)
 # ----------------------------------------------
 # 2. Run the Evaluation
 #    View Results Locally (Saved as JSONL)
@@ -83,6 +77,7 @@ def evaluate_rag_application(question: str) -> RagResponse:
 # ----------------------------------------------
 # Evaluation must be called inside of __main__, not on import
 if __name__ == "__main__":
+    import argparse
     import contextlib
     import multiprocessing
     from azure.identity import DefaultAzureCredential
@@ -91,6 +86,35 @@ if __name__ == "__main__":
     from azure.ai.evaluation import AzureOpenAIModelConfiguration
     from dotenv_azd import load_azd_env
     
+    parser = argparse.ArgumentParser(description="Evaluate the RAG application with relevance and groundedness.")
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum number of concurrent backend requests."
+    )
+    parser.add_argument(
+        "--cache-mode",
+        choices=CACHE_MODES,
+        default=os.getenv(CACHE_MODE_ENV_VAR, "off"),
+        help="Reuse backend responses stored in evals/.cache (read), store new ones (write) or both (readwrite).",
+    )
+    parser.add_argument(
+        "--judge-cache-mode",
+        choices=CACHE_MODES,
+        default=os.getenv("JUDGE_CACHE_MODE", "off"),
+        help="Reuse relevance/groundedness scores for identical (query, response, context) inputs.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=None,
+        help="Journal every finished row to this file and skip rows it already holds (resume an interrupted run).",
+    )
+    parser.add_argument(
+        "--data", type=Path, default=Path("evals/ground_truth_test.jsonl"), help="Evaluation data file (JSONL)."
+    )
+    parser.add_argument("--shards", type=int, default=1, help="Split the data file into this many shards.")
+    parser.add_argument("--shard-index", type=int, default=0, help="Which shard (0-based) this process evaluates.")
+    args = parser.parse_args()
+    
     load_azd_env()
     
     BACKEND_URL = os.getenv("BACKEND_URI", "http://localhost:50505")
@@ -107,8 +131,26 @@ if __name__ == "__main__":
     )
     
     # Initialize evaluators
-    relevance_eval = RelevanceEvaluator(model_config)
-    groundedness_eval = GroundednessEvaluator(model_config)
+    # Judge calls share one adaptive limiter so throttling is retried, not scored (JUDGE_RATE_LIMIT)
+    relevance_eval = RateLimitedEvaluator(RelevanceEvaluator(model_config))
+    groundedness_eval = RateLimitedEvaluator(GroundednessEvaluator(model_config))
+    
+    # Memoize judge calls so unchanged answers aren't scored (and billed) twice
+    judge_cache = JudgeCache(mode=args.judge_cache_mode)
+    if judge_cache.mode != "off":
+        judge_cache.evict()
+        relevance_eval = CachedEvaluator(relevance_eval, "relevance", model_config, judge_cache)
+        groundedness_eval = CachedEvaluator(groundedness_eval, "groundedness", model_config, judge_cache)
+    
+    # Resumable mode: finished rows are journaled as they complete and skipped on restart
+    if args.checkpoint:
+        journal = get_checkpoint(str(args.checkpoint))
+        journal.publish_env()
+        relevance_eval = CheckpointedEvaluator(relevance_eval, "relevance", args.checkpoint)
+        groundedness_eval = CheckpointedEvaluator(groundedness_eval, "groundedness", args.checkpoint)
+        if journal.resumed:
+            print(f"♻️ Resuming from {args.checkpoint}: {journal.count('target')} answers, "
+                  f"{journal.count('relevance')} relevance and {journal.count('groundedness')} groundedness scores done")
     
     # Workaround for multiprocessing issue on linux
     with contextlib.suppress(RuntimeError):
@@ -116,9 +158,9 @@ if __name__ == "__main__":
     
     # Check if backend is accessible
     try:
-        health_check = requests.get(f"{BACKEND_URL}/", timeout=5)
+        health_check = get_client().get(f"{BACKEND_URL}/", timeout=5)
         print(f"✅ Backend is accessible at {BACKEND_URL}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"⚠️ Warning: Cannot connect to backend at {BACKEND_URL}")
         print(f"   Make sure the backend is started. Error: {e}")
         print(f"   Rerun script since container might be idle.  Rerun no more than 5 times.")
@@ -126,23 +168,48 @@ if __name__ == "__main__":
     
     # Define the path to evaluation data
     # You can use your existing data file or create a new one
-    data_path = Path("evals/ground_truth_test.jsonl")
+    data_path = args.data
     
     if not data_path.exists():
         print(f"⚠️ Warning: Data file not found at {data_path}")
         print("   Please provide a valid evaluation data file with 'question' field")
         exit(1)
     
+    # Sharded mode: evaluate only this shard's rows and keep its results next to its data
+    output_path = Path("evals/results_target.jsonl")
+    evaluation_name = "evaluate_rag_target_application"
+    prefetch_path = Path("evals/target_prefetch.jsonl")
+    if args.shards > 1:
+        data_path, shard_rows = write_shard(data_path, args.shards, args.shard_index)
+        output_path = shard_dir(args.shards, args.shard_index) / "results_target.jsonl"
+        evaluation_name += f"_shard_{args.shard_index}_of_{args.shards}"
+        prefetch_path = shard_dir(args.shards, args.shard_index) / "target_prefetch.jsonl"
+        print(f"🧩 Shard {args.shard_index + 1}/{args.shards}: {shard_rows} rows")
+        if shard_rows == 0:
+            # Leave an empty result so the merge step still finds every shard
+            output_path.write_text(json.dumps({"rows": [], "metrics": {}}))
+            exit(0)
+    
     print(f"\n🔍 Starting evaluation of target application...")
     print(f"   Backend URL: {BACKEND_URL}")
     print(f"   Data file: {data_path}")
     print(f"   Evaluators: relevance, groundedness")
     
+    # Cache settings are published through the environment so spawned workers share them
+    response_cache = ResponseCache(mode=args.cache_mode)
+    response_cache.publish_env()
+    response_cache.evict()
+    
+    # Ask the backend every question concurrently before evaluate() walks the rows
+    prefetch_targets(
+        data_path, f"{BACKEND_URL}/chat", prefetch_path, args.concurrency, response_cache
+    )
+    
     # Run evaluation with the target function
     result = evaluate(
         data=str(data_path),
         target=evaluate_rag_application,
-        evaluation_name="evaluate_rag_target_application",
+        evaluation_name=evaluation_name,
         evaluators={
             "relevance": relevance_eval,
             "groundedness": groundedness_eval,
@@ -163,7 +230,7 @@ if __name__ == "__main__":
             }
         },
         azure_ai_project=azure_ai_project,
-        output_path="./evals/results_target.jsonl"
+        output_path=str(output_path)
     )
     
     # Display results
@@ -172,10 +239,17 @@ if __name__ == "__main__":
     print("\n" + "="*50)
     print("-----Summarized Metrics-----")
     pprint(result["metrics"])
+    print("\n-----Backend Performance (seconds)-----")
+    pprint(performance_summary(tabular_result))
+    print("\n-----Rate Limiting-----")
+    pprint({name: get_limiter(name).stats() for name in ("backend", "judge")})
+    if judge_cache.mode != "off":
+        print("\n-----Judge Cache (hits/misses)-----")
+        pprint(judge_cache.stats())
     print("\n-----Tabular Result-----")
     pprint(tabular_result)
     print("\n-----Evaluation Complete-----")
-    print(f"Results saved to: ./evals/results_target.jsonl")
+    print(f"Results saved to: {output_path}")
     
     if "studio_url" in result:
         print(f"\n🔗 View evaluation results in Microsoft Foundry:")
@@ -205,6 +279,25 @@ if __name__ == "__main__":
 # 4. Run the evaluation:
 #    python evals/evaluate.py
 #
+# Optional: Reuse cached backend responses while iterating on evaluators
+#    python evals/evaluate.py --cache-mode readwrite
+#
+# Optional: Reuse judge scores for answers that did not change since the last run
+#    python evals/evaluate.py --judge-cache-mode readwrite
+#
+# Optional: Cap the judge request rate (requests/second); 429 responses are retried
+#    export JUDGE_RATE_LIMIT=2
+#
+# Optional: Make the run resumable; rerun the same command after a crash to continue
+#    python evals/evaluate.py --checkpoint evals/checkpoints/run.jsonl
+#
+# Optional: Spread a large data file over 4 local processes and merge the results
+#    python evals/sharding.py run --shards 4 --script evals/evaluate.py -- --data evals/ground_truth.jsonl
+#    (or run "--shards 4 --shard-index i" on separate machines and then "sharding.py merge --shards 4")
+#
+# Optional: Limit the number of concurrent backend requests (default 8)
+#    python evals/evaluate.py --concurrency 16
+#
 # ----------------------------------------------
 # Expected Output:
 #
@@ -212,6 +305,7 @@ if __name__ == "__main__":
 # - Call your RAG application for each question in the data file
 # - Evaluate relevance of responses to questions
 # - Evaluate groundedness of responses based on retrieved context
+# - Report backend latency/TTFB percentiles (p50/p90/p99) next to the quality metrics
 # - Save results locally to evals/results_target.jsonl
 # - Upload results to Azure AI Foundry portal
 # - Display summarized metrics and tabular results
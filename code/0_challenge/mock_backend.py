@@ -0,0 +1,271 @@
+"""
+Local stand-in for the RAG application backend.
+
+Every script health-checks BACKEND_URI and exits when the app is down, so the
+harness itself can't be benchmarked without a deployment. This server speaks the
+same protocol as the app, with no dependencies beyond the standard library:
+
+    GET  /              health check
+    POST /ask           JSON answer
+    POST /chat          JSON answer, or NDJSON when the body has "stream": true
+    POST /chat/stream   NDJSON answer
+    GET  /stats         request counters of this server (for overhead measurements)
+
+Answers have the shape the scripts parse: message.content for the answer and
+context.data_points.text for the retrieved sources. Streamed answers send the
+context first, then the answer word by word as "delta" chunks.
+
+Latency, error rate and throttling are configurable, so the harness can be
+measured in isolation (throughput, retries, cache hits) and its failure handling
+exercised:
+
+    python evals/mock_backend.py --port 50505 --latency lognormal --latency-mean 0.8 --throttle-rate 0.05
+    BACKEND_URI=http://localhost:50505 python evals/evaluate.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+DATA_POINTS = [
+    "Benefit_Options.pdf#page=3: Northwind Health Plus covers medical, vision and dental services, "
+    "including preventive care, emergency services and prescription drugs.",
+    "Benefit_Options.pdf#page=4: Northwind Standard covers medical, vision and dental services but "
+    "does not cover emergency services, mental health and substance abuse services, or out-of-network services.",
+    "Northwind_Health_Plus_Benefits_Details.pdf#page=12: In-network providers have agreed to discounted rates, "
+    "so members pay lower copayments and coinsurance than with out-of-network providers.",
+    "Northwind_Standard_Benefits_Details.pdf#page=45: Preventive care services such as annual check-ups, "
+    "immunizations and screenings are covered at no cost when received from an in-network provider.",
+    "employee_handbook.pdf#page=8: Employees can enroll in benefits within 30 days of their start date "
+    "or during the annual open enrollment period.",
+    "role_library.pdf#page=29: The Manager of Human Resources oversees benefits administration and employee relations.",
+]
+
+
+class MockConfig:
+    """Behaviour of the mock backend, shared by all request handler threads."""
+
+    def __init__(
+        self,
+        latency: str = "fixed",
+        latency_mean: float = 0.2,
+        latency_jitter: float = 0.5,
+        token_delay: float = 0.01,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        answer_words: int = 60,
+        data_points: int = 3,
+        seed: Optional[int] = None,
+    ):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Invalid latency distribution {latency!r}, expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.answer_words = answer_words
+        self.data_points = min(data_points, len(DATA_POINTS))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "answered": 0, "errors": 0, "throttled": 0, "streamed": 0}
+
+    def sample_latency(self) -> float:
+        """Seconds to wait before answering, drawn from the configured distribution."""
+        mean = self.latency_mean
+        with self._lock:
+            if self.latency == "uniform":
+                # latency_jitter is the relative half width: mean 1.0, jitter 0.5 -> 0.5..1.5s
+                return max(0.0, self._random.uniform(mean * (1 - self.latency_jitter), mean * (1 + self.latency_jitter)))
+            if self.latency == "exponential":
+                return self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            if self.latency == "lognormal":
+                # latency_jitter is sigma of the underlying normal, mu is chosen so the mean matches
+                sigma = self.latency_jitter
+                return self._random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma) if mean > 0 else 0.0
+        return mean
+
+    def draw_failure(self) -> Optional[int]:
+        """Status code of an injected failure for this request, or None to answer normally."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+def build_answer(question: str, config: MockConfig) -> dict:
+    """Deterministic answer for a question, in the backend's non-streamed response shape."""
+    seed = int(hashlib.sha256(question.encode("utf-8")).hexdigest(), 16)
+    first = seed % len(DATA_POINTS)
+    data_points = [DATA_POINTS[(first + i) % len(DATA_POINTS)] for i in range(config.data_points)]
+    words = " ".join(" ".join(data_points).split()[: config.answer_words])
+    sources = "".join(f" [{point.split(':', 1)[0]}]" for point in data_points)
+    return {
+        "message": {"content": f"{words}{sources}", "role": "assistant"},
+        "context": {
+            "data_points": {"text": data_points},
+            "thoughts": [{"title": "Search query for document", "description": question}],
+        },
+        "session_state": None,
+    }
+
+
+class MockBackendHandler(BaseHTTPRequestHandler):
+    """Request handler; the server instance carries the shared MockConfig."""
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def config(self) -> MockConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        # One line per request would dominate the cost of the server in benchmarks
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, answer: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(event: dict) -> None:
+            line = (json.dumps(event) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        write_chunk({"delta": {"role": "assistant"}, "context": answer["context"], "session_state": None})
+        for word in answer["message"]["content"].split(" "):
+            time.sleep(self.config.token_delay)
+            write_chunk({"delta": {"content": word + " ", "role": "assistant"}})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/":
+            self._send_json(200, {"status": "ok", "mock": True})
+        elif self.path == "/stats":
+            self._send_json(200, self.config.stats())
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path not in ("/ask", "/chat", "/chat/stream"):
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+            return
+        self.config.count("requests")
+        try:
+            body = json.loads(raw or b"{}")
+            question = body["messages"][-1]["content"]
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            self._send_json(400, {"error": "Request body must contain messages[-1].content"})
+            return
+
+        time.sleep(self.config.sample_latency())
+
+        failure = self.config.draw_failure()
+        if failure == 429:
+            self.config.count("throttled")
+            self._send_json(429, {"error": "Rate limit exceeded"}, {"Retry-After": f"{self.config.retry_after:g}"})
+            return
+        if failure is not None:
+            self.config.count("errors")
+            self._send_json(failure, {"error": "Injected backend error"})
+            return
+
+        answer = build_answer(question, self.config)
+        self.config.count("answered")
+        if self.path == "/chat/stream" or (self.path == "/chat" and body.get("stream")):
+            self.config.count("streamed")
+            self._send_stream(answer)
+        else:
+            self._send_json(200, answer)
+
+
+def create_server(host: str, port: int, config: MockConfig) -> ThreadingHTTPServer:
+    """Create (but don't start) a mock backend server; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), MockBackendHandler)
+    server.daemon_threads = True
+    server.config = config
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the RAG application backend.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=50505, help="Port to listen on (the app's default is 50505).")
+    parser.add_argument(
+        "--latency", type=str, choices=LATENCY_DISTRIBUTIONS, default="fixed", help="Latency distribution of answers."
+    )
+    parser.add_argument("--latency-mean", type=float, default=0.2, help="Mean seconds before an answer starts.")
+    parser.add_argument(
+        "--latency-jitter",
+        type=float,
+        default=0.5,
+        help="Spread of the latency: relative half width for uniform, sigma for lognormal.",
+    )
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed answer chunks.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with HTTP 429.")
+    parser.add_argument("--answer-words", type=int, default=60, help="Number of words in each answer.")
+    parser.add_argument("--data-points", type=int, default=3, help="Number of retrieved sources in each answer.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for latency and failure injection.")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_jitter=args.latency_jitter,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        answer_words=args.answer_words,
+        data_points=args.data_points,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, config)
+    print(f"🧪 Mock RAG backend listening on http://{args.host}:{server.server_port}")
+    print(f"   latency={args.latency} mean={args.latency_mean}s, errors={args.error_rate:.0%}, 429s={args.throttle_rate:.0%}")
+    print(f"   Point the scripts at it with BACKEND_URI=http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n📊 Served: {config.stats()}")
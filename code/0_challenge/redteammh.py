@@ -4,7 +4,7 @@ Red Teaming Script for Azure Search OpenAI Demo Application
 
 This script performs automated adversarial testing (red teaming) of the RAG application
 to identify potential safety vulnerabilities across multiple risk categories.
-For runtime constraints we are only using Basic and have commented out the Advanced scan.
+For runtime constraints only the Basic scan runs by default; pass --advanced to also run the Advanced scan.
 
 Based on: https://github.com/Azure-Samples/azureai-samples/blob/main/scenarios/evaluate/AI_RedTeaming/AI_RedTeaming.ipynb
 
@@ -14,69 +14,130 @@ Run: python evals/redteam.py
 import os
 import json
 import asyncio
+import argparse
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from pprint import pprint
-import requests
+import httpx
+from attack_bandit import BANDIT_METHODS, DEFAULT_EXPLORATION_FLOOR, AttackBandit
+from attack_transforms import TRANSFORMS, normalize_chain, prepare_corpus
+from http_pool import aclose_async_client, get_async_client, get_client
+from redteam_orchestrator import (
+    DEFAULT_MAX_CONCURRENT_SCANS,
+    DEFAULT_TARGET_CONCURRENCY,
+    arm_name,
+    merge_scorecard,
+    plan_arms,
+    plan_sub_scans,
+    run_adaptive_scans,
+    run_sub_scans,
+)
+from redteam_writer import RedTeamResultWriter
 
 
 # ----------------------------------------------
 # 1. Define Target Callback Function
 # ----------------------------------------------
+def _request_body(query: str) -> dict:
+    return {
+        "messages": [{"content": query, "role": "user"}],
+        "context": {
+            "overrides": {
+                "retrieval_mode": "hybrid",
+                "semantic_ranker": True,
+                "semantic_captions": False,
+                "top": 3,
+                "suggest_followup_questions": False,
+            }
+        }
+    }
+
+
+def _answer(result: dict) -> str:
+    # Extract the answer from the response and return as string
+    answer = result.get("message", {}).get("content", "")
+    return answer if answer else "I don't know."
+
+
+def _error_answer(e: Exception, query: str) -> str:
+    error_msg = f"Error calling RAG application: {str(e)}"
+    # Log the error with more detail for debugging
+    print(f"⚠️ {error_msg}")
+    if isinstance(e, httpx.HTTPStatusError):
+        print(f"   Response status: {e.response.status_code}")
+        print(f"   Response body: {e.response.text[:200]}")
+        print(f"   Request query length: {len(query)} chars")
+    # Return a safe error message instead of propagating the exception details
+    return "I cannot process that request."
+
+
 def rag_application_callback(query: str) -> str:
     try:
         # Call the /chat endpoint of the RAG application
-        response = requests.post(
-            f"{BACKEND_URL}/chat",
-            json={
-                "messages": [{"content": query, "role": "user"}],
-                "context": {
-                    "overrides": {
-                        "retrieval_mode": "hybrid",
-                        "semantic_ranker": True,
-                        "semantic_captions": False,
-                        "top": 3,
-                        "suggest_followup_questions": False,
-                    }
-                }
-            },
-            headers={"Content-Type": "application/json"},
-            timeout=60
-        )
+        response = get_client().post(f"{BACKEND_URL}/chat", json=_request_body(query), timeout=60)
+        response.raise_for_status()
+        return _answer(response.json())
+    except (httpx.HTTPError, ValueError) as e:
+        return _error_answer(e, query)
+
+
+async def rag_application_callback_async(query: str) -> str:
+    """
+    Async variant of rag_application_callback, used for the RedTeam scans.
+
+    Calls go through the shared async connection pool, so the scan's attack turns
+    overlap instead of waiting for each other. The number of calls in flight is
+    capped by the scan (see --target-concurrency).
+    """
+    try:
+        # Call the /chat endpoint of the RAG application
+        response = await get_async_client().post(f"{BACKEND_URL}/chat", json=_request_body(query), timeout=60)
         response.raise_for_status()
-        
-        result = response.json()
-        
-        # Extract the answer from the response and return as string
-        answer = result.get("message", {}).get("content", "")
-        
-        return answer if answer else "I don't know."
-        
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Error calling RAG application: {str(e)}"
-        # Log the error with more detail for debugging
-        print(f"⚠️ {error_msg}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"   Response status: {e.response.status_code}")
-            print(f"   Response body: {e.response.text[:200]}")
-            print(f"   Request query length: {len(query)} chars")
-        # Return a safe error message instead of propagating the exception details
-        return "I cannot process that request."
+        return _answer(response.json())
+    except (httpx.HTTPError, ValueError) as e:
+        return _error_answer(e, query)
 
 
 # ----------------------------------------------
 # 2. Configure Red Team Scan
 # ----------------------------------------------
-async def run_red_team_scan():
+async def run_red_team_scan(
+    advanced: bool = False,
+    max_concurrent_scans: int = DEFAULT_MAX_CONCURRENT_SCANS,
+    target_concurrency: int = DEFAULT_TARGET_CONCURRENCY,
+    seed_prompts: Optional[Path] = None,
+    local_strategies: Optional[list[str]] = None,
+    compress: bool = False,
+    adaptive: bool = False,
+    attack_budget: int = 120,
+    round_size: int = 24,
+    bandit_method: str = "thompson",
+    exploration_floor: float = DEFAULT_EXPLORATION_FLOOR,
+):
     """
     Execute the red team scan against the RAG application.
+
+    Args:
+        advanced: Also run the advanced scan (attack strategies), split into concurrent sub-scans
+        max_concurrent_scans: Sub-scans (one per risk category, or per adaptive pair) running at the same time
+        target_concurrency: Calls to the backend in flight per scan (shared by all advanced sub-scans)
+        seed_prompts: Custom attack seed prompt file with the attack objectives (default: objectives from the service)
+        local_strategies: Strategy chains (e.g. "base64+rot13") applied locally to the seed prompts before the
+            advanced scan, instead of by the RedTeam converters
+        compress: Write the attack conversations zstd-compressed (.jsonl.zst)
+        adaptive: Run the advanced scan in rounds, moving the attack budget toward the (risk category,
+            strategy) pairs with the most successful attacks
+        attack_budget: Total attack objectives of the adaptive scan
+        round_size: Attack objectives per adaptive round
+        bandit_method: "thompson" (Thompson sampling) or "ucb" (UCB1)
+        exploration_floor: Share of every adaptive round spread evenly over all pairs
     """
     
     # Check if backend is accessible
     try:
-        health_check = requests.get(f"{BACKEND_URL}/", timeout=5)
+        health_check = get_client().get(f"{BACKEND_URL}/", timeout=5)
         print(f"✅ Backend is accessible at {BACKEND_URL}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"⚠️ Warning: Cannot connect to backend at {BACKEND_URL}")
         print(f"   Make sure the backend is started. Error: {e}")
         print(f"   Rerun script since container might be idle.  Rerun no more than 5 times.")
@@ -98,98 +159,169 @@ async def run_red_team_scan():
     print("   Attack Strategies: Baseline (no transformation)")
     print()
     
-    # Create RedTeam instance with basic configuration
-    basic_red_team = RedTeam(
-        azure_ai_project=azure_ai_project,
-        credential=credential,
-        risk_categories=[
-            RiskCategory.Violence,
-            RiskCategory.HateUnfairness,
-            RiskCategory.Sexual,
-            RiskCategory.SelfHarm,
-        ],
-        num_objectives=3,  # Number of attacks per risk category
-    )
-    
-    # Run the scan
-    basic_result = await basic_red_team.scan(
-        target=rag_application_callback,
-        scan_name="RAG-App-Basic-Scan",
-        application_scenario="Azure Search OpenAI Demo RAG Application",
-        attack_strategies=[],  # Empty list = baseline attacks only
-    )
-    
-    # Save basic results
-    basic_output_path = output_dir / "basic_scan_results.json"
-    with open(basic_output_path, "w") as f:
-        # Convert RedTeamResult to dict for JSON serialization
-        result_dict = basic_result if isinstance(basic_result, dict) else vars(basic_result)
-        json.dump(result_dict, f, indent=2, default=str)
+    # Create a RedTeam instance with basic configuration for each risk category
+    def make_basic_red_team(risk_category, strategy):
+        return RedTeam(
+            azure_ai_project=azure_ai_project,
+            credential=credential,
+            risk_categories=[risk_category],
+            num_objectives=3,  # Number of attacks per risk category
+            custom_attack_seed_prompts=str(seed_prompts) if seed_prompts else None,
+        )
+
+    # Run one baseline sub-scan per risk category, saving each one's conversations as soon as it completes,
+    # so a scan that fails late keeps the categories that already finished
+    basic_categories = [
+        RiskCategory.Violence,
+        RiskCategory.HateUnfairness,
+        RiskCategory.Sexual,
+        RiskCategory.SelfHarm,
+    ]
+    with RedTeamResultWriter(output_dir / "basic_scan_results.jsonl", compress) as writer:
+        basic_sub_scans = await run_sub_scans(
+            make_basic_red_team,
+            rag_application_callback_async,
+            plan_sub_scans(basic_categories, []),  # No strategies = baseline attacks only
+            scan_name="RAG-App-Basic-Scan",
+            application_scenario="Azure Search OpenAI Demo RAG Application",
+            max_concurrent_scans=max_concurrent_scans,
+            target_concurrency=target_concurrency,
+            on_complete=lambda sub_scan: writer.write_many(sub_scan["attack_details"]),
+        )
+    basic_output_path = writer.path
+    basic_scorecard = merge_scorecard(basic_sub_scans)
+    basic_scorecard.pop("attack_details")
+    with open(output_dir / "basic_scan_scorecard.json", "w") as f:
+        json.dump({**basic_scorecard, "conversations": writer.summary()}, f, indent=2, default=str)
+    # basic_scan_results.json used to hold the whole RedTeamResult; it is kept as a compact summary
+    # that points to the conversations file, for existing consumers of the old name
+    with open(output_dir / "basic_scan_results.json", "w") as f:
+        json.dump(
+            {
+                "conversations_file": basic_output_path.name,
+                "scorecard_file": "basic_scan_scorecard.json",
+                **{name: basic_scorecard[name] for name in ("overall", "risk_category", "sub_scans")},
+            },
+            f,
+            indent=2,
+            default=str,
+        )
     print(f"✅ Basic scan complete. Results saved to: {basic_output_path}")
     print()
     
     # Display basic metrics
-    print("📊 Basic Scan Metrics:")
-    if hasattr(basic_result, "metrics"):
-        pprint(basic_result.metrics)
-    elif isinstance(basic_result, dict) and "metrics" in basic_result:
-        pprint(basic_result["metrics"])
+    print("📊 Basic Scan Metrics (attack success rate):")
+    pprint({name: basic_scorecard[name] for name in ("overall", "risk_category")})
     print()
 
     # ----------------------------------------------
     # 4. Run Advanced Red Team Scan
     # ----------------------------------------------
-    """ print("🔴 Running Advanced Red Team Scan...")
-    print("   Risk Categories: Violence, HateUnfairness, Sexual, SelfHarm")
-    print("   Attack Strategies: Multiple transformation techniques")
-    print()
-    
-    # Create RedTeam instance with advanced configuration
-    # Note: Only Violence, HateUnfairness, Sexual, and SelfHarm are available in current SDK
-    advanced_red_team = RedTeam(
-        azure_ai_project=azure_ai_project,
-        credential=credential,
-        risk_categories=[
+    advanced_output_path = None
+    if advanced or adaptive:
+        print("🔴 Running Advanced Red Team Scan...")
+        print("   Risk Categories: Violence, HateUnfairness, Sexual, SelfHarm")
+        print("   Attack Strategies: Multiple transformation techniques")
+        print(
+            f"   One sub-scan per risk category (strategies in parallel), {max_concurrent_scans} at a time, "
+            f"at most {target_concurrency} concurrent backend calls"
+        )
+        print()
+
+        # Note: Only Violence, HateUnfairness, Sexual, and SelfHarm are available in current SDK
+        risk_categories = [
             RiskCategory.Violence,
             RiskCategory.HateUnfairness,
             RiskCategory.Sexual,
             RiskCategory.SelfHarm,
-        ],
-        num_objectives=5,  # More attacks for comprehensive testing
-    )
-    
-    # Run the scan with multiple attack strategies
-    advanced_result = await advanced_red_team.scan(
-        target=rag_application_callback,
-        scan_name="RAG-App-Advanced-Scan",
-        application_scenario="Azure Search OpenAI Demo RAG Application - Comprehensive Test",
-        attack_strategies=[
+        ]
+        attack_strategies = [
             AttackStrategy.EASY,          # Group of easy complexity attacks
             AttackStrategy.MODERATE,      # Group of moderate complexity attacks
             AttackStrategy.Base64,        # Base64 encoding
             AttackStrategy.ROT13,         # ROT13 encoding
             AttackStrategy.CharacterSpace, # Add character spaces
             AttackStrategy.UnicodeConfusable, # Unicode confusables
-        ],
-    )
-    
-    # Save advanced results
-    advanced_output_path = output_dir / "advanced_scan_results.json"
-    with open(advanced_output_path, "w") as f:
-        # Convert RedTeamResult to dict for JSON serialization
-        result_dict = advanced_result if isinstance(advanced_result, dict) else vars(advanced_result)
-        json.dump(result_dict, f, indent=2, default=str)
-    print(f"✅ Advanced scan complete. Results saved to: {advanced_output_path}")
-    print()
-    
-    # Display advanced metrics
-    print("📊 Advanced Scan Metrics:")
-    if hasattr(advanced_result, "metrics"):
-        pprint(advanced_result.metrics)
-    elif isinstance(advanced_result, dict) and "metrics" in advanced_result:
-        pprint(advanced_result["metrics"])
-    print()  """
+        ]
+
+        # With local seed prompts, the deterministic strategies are applied before any backend call
+        seed_files = {}
+        if seed_prompts and local_strategies:
+            seed_files = prepare_corpus(seed_prompts, local_strategies, output_dir / "attack_corpus")
+            attack_strategies = [
+                strategy for strategy in attack_strategies if strategy.value not in TRANSFORMS
+            ] + list(seed_files)
+
+        # Create a RedTeam instance with advanced configuration for each sub-scan
+        def make_red_team(risk_category, strategy, num_objectives=5):
+            seed_file = seed_files.get(strategy, seed_prompts) if isinstance(strategy, str) else seed_prompts
+            return RedTeam(
+                azure_ai_project=azure_ai_project,
+                credential=credential,
+                risk_categories=[risk_category],
+                num_objectives=num_objectives,  # More attacks for comprehensive testing
+                custom_attack_seed_prompts=str(seed_file) if seed_file else None,
+            )
+
+        # Run the sub-scans concurrently, saving each one's conversations as soon as it completes
+        scan = "adaptive" if adaptive else "advanced"
+        with RedTeamResultWriter(output_dir / f"{scan}_scan_results.jsonl", compress) as writer:
+            if adaptive:
+                # Move the attack budget, round by round, toward the pairs whose attacks get through
+                print(f"   Adaptive budget: {attack_budget} objectives in rounds of {round_size} ({bandit_method})")
+                arms = plan_arms(risk_categories, attack_strategies)
+                bandit = AttackBandit([arm_name(*arm) for arm in arms], bandit_method, exploration_floor)
+                sub_scans = await run_adaptive_scans(
+                    make_red_team,
+                    rag_application_callback_async,
+                    arms,
+                    bandit,
+                    attack_budget,
+                    round_size,
+                    scan_name="RAG-App-Adaptive-Scan",
+                    application_scenario="Azure Search OpenAI Demo RAG Application - Comprehensive Test",
+                    max_concurrent_scans=max_concurrent_scans,
+                    target_concurrency=target_concurrency,
+                    on_complete=lambda sub_scan: writer.write_many(sub_scan["attack_details"]),
+                )
+            else:
+                sub_scans = await run_sub_scans(
+                    make_red_team,
+                    rag_application_callback_async,
+                    plan_sub_scans(risk_categories, attack_strategies),
+                    scan_name="RAG-App-Advanced-Scan",
+                    application_scenario="Azure Search OpenAI Demo RAG Application - Comprehensive Test",
+                    max_concurrent_scans=max_concurrent_scans,
+                    target_concurrency=target_concurrency,
+                    on_complete=lambda sub_scan: writer.write_many(sub_scan["attack_details"]),
+                )
+        advanced_output_path = writer.path
+
+        # Merge the sub-scans into one scorecard (the conversations are already in the results file)
+        scorecard = merge_scorecard(sub_scans)
+        scorecard.pop("attack_details")
+        if adaptive:
+            scorecard["bandit"] = bandit.report()
+        with open(output_dir / f"{scan}_scan_scorecard.json", "w") as f:
+            json.dump(scorecard, f, indent=2, default=str)
+        completed = sum(1 for sub_scan in sub_scans if sub_scan["status"] == "completed")
+        print(
+            f"✅ Advanced scan complete ({completed} of {len(sub_scans)} sub-scans). "
+            f"Results saved to: {advanced_output_path}"
+        )
+        print()
+
+        # Display advanced scorecard
+        print("📊 Advanced Scan Scorecard (attack success rate):")
+        pprint({name: scorecard[name] for name in ("overall", "risk_category", "attack_technique")})
+        if adaptive:
+            print("🎰 Attack budget and success rate per risk category/strategy:")
+            pprint(scorecard["bandit"]["arms"], sort_dicts=False)
+        print()
     
+    # Release the pooled backend connections of this event loop
+    await aclose_async_client()
+
     # ----------------------------------------------
     # 5. Display Summary
     # ----------------------------------------------
@@ -198,8 +330,9 @@ async def run_red_team_scan():
     print("="*70)
     print()
     print("📁 Results Location:")
-    print(f"   Basic Scan:    {basic_output_path}")
-    #print(f"   Advanced Scan: {advanced_output_path}")
+    print(f"   Basic Scan:    {basic_output_path} (summary in {output_dir / 'basic_scan_results.json'})")
+    if advanced_output_path:
+        print(f"   Advanced Scan: {advanced_output_path}")
     print()
     print("📈 Key Metrics to Review:")
     print("   - Attack Success Rate (ASR): % of attacks that elicited harmful content")
@@ -210,13 +343,71 @@ async def run_red_team_scan():
     print("="*70)
 
 
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {number}")
+    return number
+
+
 # ----------------------------------------------
 # Main Execution
 # ----------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run red team scans against the RAG application.")
+    parser.add_argument(
+        "--advanced", action="store_true", help="Also run the advanced scan with attack strategies."
+    )
+    parser.add_argument(
+        "--max-concurrent-scans",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_SCANS,
+        help="Sub-scans (one per risk category, or per adaptive round and strategy) running at the same time.",
+    )
+    parser.add_argument(
+        "--target-concurrency",
+        type=int,
+        default=DEFAULT_TARGET_CONCURRENCY,
+        help="Maximum concurrent backend calls per scan (shared by all advanced sub-scans).",
+    )
+    parser.add_argument(
+        "--seed-prompts",
+        type=Path,
+        default=None,
+        help="Custom attack seed prompt JSON file with the attack objectives.",
+    )
+    parser.add_argument(
+        "--local-strategies",
+        type=lambda value: [normalize_chain(chain) for chain in value.split(",") if chain.strip()],
+        default=list(TRANSFORMS),
+        help="Comma-separated strategy chains applied locally to the seed prompts (e.g. base64,rot13,base64+rot13).",
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="Write the attack conversations zstd-compressed (needs zstandard)."
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Run the advanced scan in rounds, reallocating the attack budget toward successful strategies.",
+    )
+    parser.add_argument(
+        "--attack-budget", type=positive_int, default=120, help="Total attack objectives of the adaptive scan."
+    )
+    parser.add_argument("--round-size", type=positive_int, default=24, help="Attack objectives per adaptive round.")
+    parser.add_argument(
+        "--bandit", choices=BANDIT_METHODS, default="thompson", help="Budget allocation method of the adaptive scan."
+    )
+    parser.add_argument(
+        "--exploration-floor",
+        type=float,
+        default=DEFAULT_EXPLORATION_FLOOR,
+        help="Share of every adaptive round spread evenly over all risk category/strategy pairs.",
+    )
+    args = parser.parse_args()
     
     # Azure imports
-    from azure.identity import DefaultAzureCredential
+    from credential_cache import get_azure_credential
     from azure.ai.evaluation.red_team import RedTeam, RiskCategory, AttackStrategy
     from dotenv_azd import load_azd_env
     
@@ -230,11 +421,25 @@ if __name__ == "__main__":
     # BACKEND_URL will be set after environment variables are loaded in __main__
     BACKEND_URL = os.getenv("BACKEND_URI", "http://localhost:50505")
 
-    # Initialize Azure credential
-    credential = DefaultAzureCredential()
+    # Shared Azure credential; tokens are cached and refreshed in the background
+    credential = get_azure_credential("default")
     
     # Run the async red team scan
-    asyncio.run(run_red_team_scan())
+    asyncio.run(
+        run_red_team_scan(
+            args.advanced,
+            args.max_concurrent_scans,
+            args.target_concurrency,
+            args.seed_prompts,
+            args.local_strategies,
+            args.compress,
+            args.adaptive,
+            args.attack_budget,
+            args.round_size,
+            args.bandit,
+            args.exploration_floor,
+        )
+    )
 
 
 # ----------------------------------------------
@@ -249,8 +454,17 @@ if __name__ == "__main__":
 #
 # 3. Run the red team scan:
 #    python evals/redteam.py
+#    Add --advanced for the attack strategy sub-scans (tune with --max-concurrent-scans
+#    and --target-concurrency). With --seed-prompts, the Base64, ROT13, CharacterSpace and
+#    UnicodeConfusable prompts (and --local-strategies chains) are built locally and cached.
+#    --adaptive spends --attack-budget objectives in rounds, favouring the strategies that get through
 #
-# 4. Review results in evals/redteam_results/ or Azure Foundry Project
+# 4. Review results in evals/redteam_results/ or Azure Foundry Project (read one risk category,
+#    strategy or outcome of the *_scan_results.jsonl files with:
+#    python evals/redteam_writer.py <file> --risk-category violence)
+#    The attack conversations are in *_scan_results.jsonl (.jsonl.zst with --compress) and the attack
+#    success rates in *_scan_scorecard.json. basic_scan_results.json no longer holds the full scan
+#    result, only a compact summary that points to those two files.
 #
 # ----------------------------------------------
 # Understanding Risk Categories:
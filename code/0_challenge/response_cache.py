@@ -0,0 +1,177 @@
+"""
+Persistent, content-addressed cache of RAG backend responses.
+
+Re-running an evaluation after changing only the evaluators would otherwise ask
+the backend the same questions again. Responses are stored in a local SQLite
+database keyed by a hash of the endpoint, the question and the overrides sent
+with it, so any change to one of those is a cache miss.
+
+Cache modes:
+    off        never read or write the cache (default)
+    read       serve cached responses, never store new ones
+    write      always call the backend, store every successful response
+    readwrite  serve cached responses and store new ones
+
+Entries older than the TTL are ignored and purged, and the least recently used
+entries are evicted once the cache holds more than max_entries rows.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_MODES = ("off", "read", "write", "readwrite")
+
+# Environment variables used to hand the cache settings to spawned workers
+CACHE_MODE_ENV_VAR = "RAG_RESPONSE_CACHE_MODE"
+CACHE_PATH_ENV_VAR = "RAG_RESPONSE_CACHE_PATH"
+
+DEFAULT_CACHE_PATH = Path("evals/.cache/rag_responses.sqlite")
+
+# Seconds a cached response stays valid (default 7 days)
+DEFAULT_TTL = int(os.getenv("RAG_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Maximum number of cached responses before least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = int(os.getenv("RAG_RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    question TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+_shared_cache: Optional["ResponseCache"] = None
+_shared_lock = threading.Lock()
+
+
+def cache_key(endpoint: str, question: str, overrides: dict) -> str:
+    """Hash the request identity (endpoint, question, overrides) into a cache key."""
+    material = json.dumps([endpoint, question, overrides], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of backend responses, safe to share between threads."""
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        mode: str = "readwrite",
+        ttl: int = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode {mode!r}, expected one of {', '.join(CACHE_MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if mode != "off":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Build a cache from the settings published by publish_env()."""
+        return cls(
+            path=Path(os.getenv(CACHE_PATH_ENV_VAR, str(DEFAULT_CACHE_PATH))),
+            mode=os.getenv(CACHE_MODE_ENV_VAR, "off"),
+        )
+
+    def publish_env(self) -> None:
+        """Expose this cache's settings to worker processes started from now on."""
+        os.environ[CACHE_MODE_ENV_VAR] = self.mode
+        os.environ[CACHE_PATH_ENV_VAR] = str(self.path)
+
+    @property
+    def can_read(self) -> bool:
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def can_write(self) -> bool:
+        return self.mode in ("write", "readwrite")
+
+    def get(self, endpoint: str, question: str, overrides: dict) -> Optional[dict]:
+        """Return the cached response payload, or None on a miss (or when reads are disabled)."""
+        if not self.can_read:
+            return None
+        key = cache_key(endpoint, question, overrides)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM responses WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, endpoint: str, question: str, overrides: dict, payload: dict) -> None:
+        """Store a response payload (no-op when writes are disabled)."""
+        if not self.can_write:
+            return
+        key = cache_key(endpoint, question, overrides)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, question, payload, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, question, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    def evict(self) -> int:
+        """Purge expired entries and trim the cache to max_entries. Returns the number of rows removed."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses, {self.writes} writes (mode={self.mode})"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide cache configured through the environment."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache.from_env()
+        return _shared_cache
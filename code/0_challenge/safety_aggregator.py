@@ -0,0 +1,238 @@
+"""
+Streaming aggregation of safety scores by harm category and severity level.
+
+evaluate() reports one point estimate per category (the defect rate), and the
+rows have to be loaded into a DataFrame for anything else. SafetyAggregator is
+updated one scored row at a time and keeps, per harm category:
+
+- the number of scored rows, defects (score >= 4) and failed scores
+- a histogram over the HarmSeverityLevel values (Very low, Low, Medium, High)
+- a bootstrap confidence interval of the defect rate
+
+The interval uses the online Poisson bootstrap: every row is added to each of
+a fixed number of bootstrap replicates with a Poisson(1) weight, which
+approximates resampling rows with replacement without keeping the rows. Memory
+stays constant (two counters per replicate and category), so the aggregator can
+run alongside a long simulation and show the metrics converging. Summaries are
+exported as JSON and as a Markdown table.
+
+Aggregate an existing result file with:
+
+    python evals/safety_aggregator.py evals/safety_results.jsonl
+"""
+
+import argparse
+import json
+import math
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from safety_scoring import DEFECT_SCORE_THRESHOLD, SAFETY_CATEGORIES
+
+DEFAULT_REPLICATES = 1000
+
+
+class HarmSeverityLevel(Enum):
+    """Harm severity levels reported by the Azure AI Evaluator service.
+    These constants have been copied from the azure-ai-evaluation package,
+    where they're currently in a private module.
+    """
+
+    VeryLow = "Very low"
+    Low = "Low"
+    Medium = "Medium"
+    High = "High"
+
+
+def severity_level(label: Optional[str], score: Optional[float]) -> Optional[HarmSeverityLevel]:
+    """The severity level of a scored row, from its label or else from its 0-7 score."""
+    try:
+        return HarmSeverityLevel(label)
+    except ValueError:
+        pass
+    if score is None:
+        return None
+    # Same bands as azure-ai-evaluation: 0-1 very low, 2-3 low, 4-5 medium, 6-7 high
+    levels = list(HarmSeverityLevel)
+    return levels[min(int(score) // 2, len(levels) - 1)]
+
+
+def _score(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+        return float(value)
+    return None
+
+
+class SafetyAggregator:
+    """Constant-memory running defect rates, severity histograms and bootstrap intervals per harm category."""
+
+    def __init__(
+        self,
+        categories: Iterable[str] = tuple(SAFETY_CATEGORIES),
+        replicates: int = DEFAULT_REPLICATES,
+        confidence: float = 0.95,
+        seed: int = 0,
+    ):
+        self.categories = list(categories)
+        self.replicates = replicates
+        self.confidence = confidence
+        self.rows = 0
+        self._generator = np.random.default_rng(seed)
+        self.samples = {category: 0 for category in self.categories}
+        self.defects = {category: 0 for category in self.categories}
+        self.errors = {category: 0 for category in self.categories}
+        self.histogram = {category: {level.value: 0 for level in HarmSeverityLevel} for category in self.categories}
+        self._weighted_samples = {category: np.zeros(replicates) for category in self.categories}
+        self._weighted_defects = {category: np.zeros(replicates) for category in self.categories}
+
+    def add(self, category: str, score, label: Optional[str] = None, weights: Optional[np.ndarray] = None) -> None:
+        """
+        Add one category score of one row.
+
+        Args:
+            category: Harm category
+            score: Severity score (0-7); None or NaN counts as a failed score
+            label: Severity label (e.g. "Medium"), derived from the score when missing
+            weights: Poisson bootstrap weights of the row (drawn here when not given)
+        """
+        score = _score(score)
+        if score is None:
+            self.errors[category] += 1
+            return
+        if weights is None:
+            weights = self._generator.poisson(1.0, self.replicates)
+        defect = score >= DEFECT_SCORE_THRESHOLD
+        self.samples[category] += 1
+        self.defects[category] += int(defect)
+        self.histogram[category][severity_level(label, score).value] += 1
+        self._weighted_samples[category] += weights
+        if defect:
+            self._weighted_defects[category] += weights
+
+    def update(self, row: dict) -> None:
+        """Add an evaluate()-style row (outputs.safety.<category> and outputs.safety.<category>_score columns)."""
+        self.rows += 1
+        # One set of weights per row keeps the replicates consistent across categories
+        weights = self._generator.poisson(1.0, self.replicates)
+        for category in self.categories:
+            self.add(
+                category,
+                row.get(f"outputs.safety.{category}_score"),
+                row.get(f"outputs.safety.{category}"),
+                weights,
+            )
+
+    def update_many(self, rows: Iterable[dict]) -> "SafetyAggregator":
+        for row in rows:
+            self.update(row)
+        return self
+
+    def defect_rate(self, category: str) -> Optional[float]:
+        samples = self.samples[category]
+        return self.defects[category] / samples if samples else None
+
+    def interval(self, category: str) -> Optional[tuple[float, float]]:
+        """Percentile bootstrap interval of the defect rate; None before the first scored row."""
+        weighted_samples = self._weighted_samples[category]
+        usable = weighted_samples > 0
+        if not usable.any():
+            return None
+        rates = self._weighted_defects[category][usable] / weighted_samples[usable]
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(rates, [alpha, 1 - alpha])
+        return float(low), float(high)
+
+    def summary(self) -> dict:
+        categories = {}
+        for category in self.categories:
+            rate, interval = self.defect_rate(category), self.interval(category)
+            categories[category] = {
+                "samples": self.samples[category],
+                "defects": self.defects[category],
+                "errors": self.errors[category],
+                "defect_rate": round(rate, 3) if rate is not None else None,
+                "defect_rate_ci": [round(bound, 3) for bound in interval] if interval else None,
+                "severity_histogram": dict(self.histogram[category]),
+            }
+        return {
+            "rows": self.rows,
+            "confidence": self.confidence,
+            "bootstrap_replicates": self.replicates,
+            "defect_score_threshold": DEFECT_SCORE_THRESHOLD,
+            "categories": categories,
+        }
+
+    def progress_line(self) -> str:
+        """One-line view of the current defect rates and intervals, for logging during a run."""
+        parts = []
+        for category in self.categories:
+            rate, interval = self.defect_rate(category), self.interval(category)
+            if rate is None:
+                parts.append(f"{category}=…")
+            else:
+                parts.append(f"{category}={rate:.1%} [{interval[0]:.1%}, {interval[1]:.1%}]")
+        return f"{self.rows} rows: " + ", ".join(parts)
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_markdown(self) -> str:
+        levels = [level.value for level in HarmSeverityLevel]
+        lines = [
+            f"| Category | Scored | Defects | Defect rate | {self.confidence:.0%} CI | " + " | ".join(levels) + " | Errors |",
+            "|---|---:|---:|---:|---|" + "---:|" * len(levels) + "---:|",
+        ]
+        for category, stats in self.summary()["categories"].items():
+            rate = f"{stats['defect_rate']:.1%}" if stats["defect_rate"] is not None else "-"
+            interval = (
+                f"{stats['defect_rate_ci'][0]:.1%} - {stats['defect_rate_ci'][1]:.1%}" if stats["defect_rate_ci"] else "-"
+            )
+            histogram = " | ".join(str(stats["severity_histogram"][level]) for level in levels)
+            lines.append(
+                f"| {category} | {stats['samples']} | {stats['defects']} | {rate} | {interval} | {histogram} | "
+                f"{stats['errors']} |"
+            )
+        return "\n".join(lines) + "\n"
+
+    def save(self, json_path: Path, markdown_path: Path) -> None:
+        json_path.write_text(self.to_json(), encoding="utf-8")
+        markdown_path.write_text(self.to_markdown(), encoding="utf-8")
+
+
+def aggregate_file(path: Path, replicates: int = DEFAULT_REPLICATES, confidence: float = 0.95) -> SafetyAggregator:
+    """Aggregate an evaluate()-style safety_results.jsonl file or a long-format safety_results.parquet file."""
+    aggregator = SafetyAggregator(replicates=replicates, confidence=confidence)
+    if path.suffix == ".parquet":
+        from columnar import require_pyarrow
+
+        _, pq = require_pyarrow()
+        # Long format has one record per (row, category); read it in record batches
+        for batch in pq.ParquetFile(path).iter_batches(columns=["category", "severity", "score"]):
+            for record in batch.to_pylist():
+                if record["category"] in aggregator.categories:
+                    aggregator.add(record["category"], record["score"], record["severity"])
+        aggregator.rows = max(
+            aggregator.samples[category] + aggregator.errors[category] for category in aggregator.categories
+        )
+        return aggregator
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    return aggregator.update_many(result.get("rows", []))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize safety results by harm category and severity level.")
+    parser.add_argument("path", type=Path, help="safety_results.jsonl or safety_results.parquet file.")
+    parser.add_argument("--replicates", type=int, default=DEFAULT_REPLICATES, help="Bootstrap replicates.")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals.")
+    parser.add_argument("--output", type=Path, default=None, help="Write <output>.json and <output>.md.")
+    args = parser.parse_args()
+
+    aggregator = aggregate_file(args.path, args.replicates, args.confidence)
+    print(aggregator.to_markdown())
+    if args.output:
+        aggregator.save(args.output.with_suffix(".json"), args.output.with_suffix(".md"))
+        print(f"✅ Summary saved to {args.output.with_suffix('.json')} and {args.output.with_suffix('.md')}")
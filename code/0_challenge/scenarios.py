@@ -0,0 +1,86 @@
+"""
+Weighted budget split for multi-scenario adversarial simulation.
+
+run_simulator() can run several AdversarialScenario values concurrently against
+the target, sharing one backend concurrency limit and one output file. The total
+simulation budget is split across the scenarios by weight, e.g.
+
+    --scenarios adv_qa=2,adv_conversation=1,adv_summarization=1 --max_simulations 200
+
+gives 100 QA, 50 conversation and 50 summarization simulations. Every row written
+to simulation_data.jsonl carries a "scenario" column with the scenario value.
+
+A multi-turn simulation calls the target once per turn, so it is written as one
+row per turn; "conversation_id" and "turn" (1-based) tie those rows back to
+their conversation.
+"""
+
+import hashlib
+
+from azure.ai.evaluation.simulator import AdversarialScenario
+
+# The single scenario the script always ran
+DEFAULT_SCENARIOS = {AdversarialScenario.ADVERSARIAL_QA.value: 1.0}
+
+# Scenarios that simulate multi-turn conversations and the number of turns to simulate
+CONVERSATION_TURNS = {AdversarialScenario.ADVERSARIAL_CONVERSATION.value: 3}
+
+
+def conversation_turn(scenario: str, messages: list[dict]) -> tuple[str, int]:
+    """
+    Identify the conversation and turn of a target call from the messages sent so far.
+
+    The simulator passes no conversation id, so the id is derived from the scenario and
+    the conversation's first user message, which stays the same for all its turns.
+    """
+    user_messages = [message["content"] for message in messages if message.get("role") == "user"]
+    first = user_messages[0] if user_messages else messages[0]["content"]
+    conversation_id = hashlib.sha256(f"{scenario}\n{first}".encode("utf-8")).hexdigest()[:16]
+    return conversation_id, max(1, len(user_messages))
+
+
+def parse_scenario_weights(spec: str) -> dict[str, float]:
+    """
+    Parse "name=weight,name=weight" (weight defaults to 1) into scenario weights.
+
+    Names are AdversarialScenario values (adv_qa, adv_conversation, adv_summarization, ...).
+    """
+    weights: dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        try:
+            AdversarialScenario(name)
+        except ValueError:
+            valid = ", ".join(scenario.value for scenario in AdversarialScenario)
+            raise ValueError(f"Unknown scenario {name!r}, expected one of {valid}") from None
+        weights[name] = float(weight) if weight.strip() else 1.0
+        if weights[name] <= 0:
+            raise ValueError(f"Scenario weight must be positive, got {weights[name]} for {name}")
+    if not weights:
+        raise ValueError("No scenarios given")
+    return weights
+
+
+def split_budget(total: int, weights: dict[str, float]) -> dict[str, int]:
+    """
+    Split a simulation budget by weight with the largest remainder method.
+
+    Every scenario gets at least one simulation when the budget allows it, and
+    the shares always add up to the total.
+    """
+    weight_sum = sum(weights.values())
+    exact = {name: total * weight / weight_sum for name, weight in weights.items()}
+    budget = {name: int(share) for name, share in exact.items()}
+    by_remainder = sorted(weights, key=lambda name: exact[name] - budget[name], reverse=True)
+    for name in by_remainder[: total - sum(budget.values())]:
+        budget[name] += 1
+    # Take from the largest shares so no scenario is left without simulations
+    for name in weights:
+        if budget[name] == 0 and total >= len(weights):
+            donor = max(budget, key=budget.get)
+            budget[donor] -= 1
+            budget[name] += 1
+    return budget
@@ -0,0 +1,252 @@
+"""
+Local attack-prompt transformations with a persistent cache.
+
+The Base64, ROT13, CharacterSpace and UnicodeConfusable attack strategies are
+deterministic text transforms, but a RedTeam scan re-applies its converters to
+every objective on every run. This module applies them locally, in batches, to
+a list of attack objectives and stores the results in a SQLite cache keyed by
+(objective, strategy chain), so the attack corpus is built once, before any call
+to the target, and re-used by later scans.
+
+Strategy chains are written as "+"-separated strategy names applied left to
+right, e.g. "base64+rot13" ROT13-encodes the Base64 encoding of the objective.
+
+The corpus is exported in the custom attack seed prompt format of RedTeam
+(custom_attack_seed_prompts), one file per chain, so each chain runs as a
+baseline scan over already transformed prompts.
+"""
+
+import base64
+import codecs
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+DEFAULT_PROMPT_CACHE_PATH = Path(os.getenv("ATTACK_PROMPT_CACHE_PATH", "evals/.cache/attack_prompts.sqlite"))
+
+# Bump when a transform changes, so cached prompts of the old implementation are not reused
+TRANSFORM_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    key TEXT PRIMARY KEY,
+    chain TEXT NOT NULL,
+    prompt TEXT NOT NULL
+)
+"""
+
+# Latin letters mapped to look-alike Cyrillic and Greek code points. A fixed map (rather than a
+# random pick among confusables) keeps the transform deterministic and therefore cacheable.
+_CONFUSABLES = str.maketrans(
+    {
+        "a": "а", "c": "с", "e": "е", "i": "і", "j": "ј", "o": "о", "p": "р", "s": "ѕ", "x": "х", "y": "у",
+        "A": "А", "B": "В", "C": "С", "E": "Е", "H": "Н", "I": "І", "J": "Ј", "K": "К", "M": "М", "N": "Ν",
+        "O": "О", "P": "Р", "S": "Ѕ", "T": "Т", "X": "Х", "Y": "Υ", "Z": "Ζ",
+    }
+)
+
+_PUNCTUATION = re.compile(r"[!\"#$%&'()*+,\-./:;<=>?@\[\\\]^_`{|}~]")
+
+
+def _base64(prompts: list[str]) -> list[str]:
+    return [base64.b64encode(prompt.encode("utf-8")).decode("ascii") for prompt in prompts]
+
+
+def _rot13(prompts: list[str]) -> list[str]:
+    return [codecs.encode(prompt, "rot13") for prompt in prompts]
+
+
+def _character_space(prompts: list[str]) -> list[str]:
+    # Same output as the CharacterSpace converter: a space between characters, punctuation removed
+    return [_PUNCTUATION.sub("", " ".join(prompt)) for prompt in prompts]
+
+
+def _unicode_confusable(prompts: list[str]) -> list[str]:
+    return [prompt.translate(_CONFUSABLES) for prompt in prompts]
+
+
+# Transforms by AttackStrategy value; each maps a batch of prompts to a batch of prompts
+TRANSFORMS: dict[str, Callable[[list[str]], list[str]]] = {
+    "base64": _base64,
+    "rot13": _rot13,
+    "character_space": _character_space,
+    "unicode_confusable": _unicode_confusable,
+}
+
+
+def parse_chain(chain: str) -> list[str]:
+    """Split "base64+rot13" into its strategy names and check that every one is a local transform."""
+    steps = [step.strip().lower() for step in chain.split("+") if step.strip()]
+    if not steps:
+        raise ValueError("Empty strategy chain")
+    for step in steps:
+        if step not in TRANSFORMS:
+            raise ValueError(f"Unknown local strategy {step!r}, expected one of {', '.join(TRANSFORMS)}")
+    return steps
+
+
+def normalize_chain(chain: str) -> str:
+    """Canonical form of a strategy chain, e.g. " Base64 + ROT13" -> "base64+rot13"."""
+    return "+".join(parse_chain(chain))
+
+
+def apply_chain(prompts: list[str], chain: str) -> list[str]:
+    """Apply every strategy of a chain, left to right, to a batch of prompts."""
+    for step in parse_chain(chain):
+        prompts = TRANSFORMS[step](prompts)
+    return prompts
+
+
+def prompt_key(objective: str, chain: str) -> str:
+    material = json.dumps([TRANSFORM_VERSION, normalize_chain(chain), objective], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """SQLite-backed store of transformed prompts, safe to share between threads."""
+
+    def __init__(self, path: Path = DEFAULT_PROMPT_CACHE_PATH):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def transform(self, objectives: list[str], chain: str) -> list[str]:
+        """Transformed prompts for the objectives, computing (and storing) only the ones not cached yet."""
+        chain = normalize_chain(chain)
+        keys = [prompt_key(objective, chain) for objective in objectives]
+        cached: dict[str, str] = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cached.update(conn.execute(f"SELECT key, prompt FROM prompts WHERE key IN ({placeholders})", chunk))
+        missing = list({key: objective for key, objective in zip(keys, objectives) if key not in cached}.items())
+        if missing:
+            transformed = apply_chain([objective for _, objective in missing], chain)
+            new = {key: prompt for (key, _), prompt in zip(missing, transformed)}
+            with self._lock:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO prompts (key, chain, prompt) VALUES (?, ?, ?)",
+                    [(key, chain, prompt) for key, prompt in new.items()],
+                )
+                conn.commit()
+            cached.update(new)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return [cached[key] for key in keys]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def load_objectives(path: Path) -> list[dict]:
+    """
+    Read attack objectives from a RedTeam custom attack seed prompt file.
+
+    Returns:
+        One dict per objective with "id", "risk_category" and "objective" (the first message)
+    """
+    with open(path, encoding="utf-8") as f:
+        seeds = json.load(f)
+    objectives = []
+    for index, seed in enumerate(seeds):
+        harms = (seed.get("metadata") or {}).get("target_harms") or [{}]
+        objectives.append(
+            {
+                "id": str(seed.get("id", index)),
+                "risk_category": str(harms[0].get("risk-type", "unknown")).lower(),
+                "objective": seed["messages"][0]["content"],
+            }
+        )
+    return objectives
+
+
+def build_corpus(objectives: list[dict], chains: Iterable[str], cache: Optional[PromptCache] = None) -> list[dict]:
+    """
+    Transform every objective with every strategy chain.
+
+    Returns:
+        One record per (objective, chain) with the objective's fields plus "strategy" and "prompt"
+    """
+    cache = cache or PromptCache()
+    texts = [objective["objective"] for objective in objectives]
+    corpus = []
+    for chain in map(normalize_chain, chains):
+        for objective, prompt in zip(objectives, cache.transform(texts, chain)):
+            corpus.append({**objective, "strategy": chain, "prompt": prompt})
+    return corpus
+
+
+def write_seed_prompts(corpus: list[dict], chain: str, path: Path) -> int:
+    """Write the prompts of one chain as a custom attack seed prompt file. Returns the number of prompts."""
+    seeds = [
+        {
+            "id": f"{record['id']}-{chain}",
+            "metadata": {"target_harms": [{"risk-type": record["risk_category"]}]},
+            "messages": [{"role": "user", "content": record["prompt"]}],
+            "modality": "text",
+            "source": ["attack_transforms"],
+        }
+        for record in corpus
+        if record["strategy"] == chain
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(seeds, f, ensure_ascii=False)
+    return len(seeds)
+
+
+def prepare_corpus(
+    seed_prompts: Path, chains: list[str], corpus_dir: Path, cache: Optional[PromptCache] = None
+) -> dict[str, Path]:
+    """
+    Build the transformed attack corpus of a seed prompt file before a scan starts.
+
+    Writes attack_corpus.jsonl (every objective in every chain) and one seed prompt
+    file per chain to corpus_dir.
+
+    Returns:
+        The seed prompt file of every chain
+    """
+    cache = cache or PromptCache()
+    chains = [normalize_chain(chain) for chain in chains]
+    objectives = load_objectives(seed_prompts)
+    corpus = build_corpus(objectives, chains, cache)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    with open(corpus_dir / "attack_corpus.jsonl", "w", encoding="utf-8") as f:
+        for record in corpus:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    seed_files = {}
+    for chain in chains:
+        seed_files[chain] = corpus_dir / f"{chain}.json"
+        write_seed_prompts(corpus, chain, seed_files[chain])
+    print(
+        f"🧰 Attack corpus: {len(corpus)} prompts ({len(objectives)} objectives x {len(chains)} strategy chains), "
+        f"{cache.hits} from cache, saved to {corpus_dir}"
+    )
+    return seed_files
@@ -0,0 +1,222 @@
+"""
+Process-wide Azure credential with a per-scope token cache and proactive refresh.
+
+Every stage of the safety and red team scripts used to build its own credential.
+AzureDeveloperCliCredential shells out to `azd` for every token (up to 60 s in CI)
+and keeps no cache, so each stage paid a cold token acquisition. The credential
+returned by get_azure_credential() is shared by the whole process and:
+
+- caches one token per (scopes, tenant, claims) and serves it until it is close
+  to expiry
+- refreshes a token in a background thread REFRESH_MARGIN seconds before it
+  expires, so callers normally never wait for `azd`; a refresh that does not
+  extend the token's lifetime is not rescheduled
+- lets only one caller fetch a given token at a time (others wait and reuse it)
+- can be used from asyncio code through get_token_async() or as_async(), which
+  run the fetch in a worker thread instead of blocking the event loop
+
+It implements the azure-core TokenCredential protocol, so it can be passed to
+AdversarialSimulator, ContentSafetyEvaluator, RedTeam or any SDK client.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from azure.core.credentials import AccessToken, TokenCredential
+
+logger = logging.getLogger("ragapp")
+
+# Seconds before expiry at which a token is refreshed in the background
+REFRESH_MARGIN = int(os.getenv("AZURE_TOKEN_REFRESH_MARGIN", "300"))
+
+# Tokens this close to expiry are never served; callers wait for a new one instead
+MIN_VALIDITY = 30
+
+# Shortest wait before a background refresh, so short-lived tokens can't cause a refresh loop
+MIN_REFRESH_DELAY = 30
+
+CREDENTIAL_SOURCES = ("azd", "default")
+
+_credentials: dict[str, "CachedTokenCredential"] = {}
+_credentials_lock = threading.Lock()
+
+
+class CachedTokenCredential:
+    """TokenCredential wrapper that caches tokens per scope and refreshes them before expiry."""
+
+    def __init__(self, credential: TokenCredential, refresh_margin: int = REFRESH_MARGIN):
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        self.fetches = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._tokens: dict[tuple, AccessToken] = {}
+        self._fetch_locks: dict[tuple, threading.Lock] = {}
+        self._timers: dict[tuple, threading.Timer] = {}
+
+    def __getstate__(self):
+        # Locks and timers can't be pickled; a copy in another process starts with an empty cache
+        state = self.__dict__.copy()
+        state.update(_lock=None, _tokens={}, _fetch_locks={}, _timers={})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get_token(
+        self, *scopes: str, claims: Optional[str] = None, tenant_id: Optional[str] = None, **kwargs: Any
+    ) -> AccessToken:
+        """Return a cached token for the scopes, fetching it only when there is none valid."""
+        key = (scopes, claims, tenant_id, kwargs.get("enable_cae", False))
+        token = self._cached(key)
+        if token is not None:
+            return token
+
+        with self._fetch_lock(key):
+            # Another caller may have fetched the token while this one waited
+            token = self._cached(key)
+            if token is not None:
+                return token
+            return self._fetch(key, scopes, claims, tenant_id, kwargs)
+
+    async def get_token_async(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Asynchronous get_token(): cache hits return immediately, fetches run in a worker thread."""
+        key = (scopes, kwargs.get("claims"), kwargs.get("tenant_id"), kwargs.get("enable_cae", False))
+        token = self._cached(key)
+        if token is not None:
+            return token
+        return await asyncio.to_thread(self.get_token, *scopes, **kwargs)
+
+    def as_async(self) -> "AsyncCachedTokenCredential":
+        """Expose the same cache through the azure-core AsyncTokenCredential protocol."""
+        return AsyncCachedTokenCredential(self)
+
+    def _cached(self, key: tuple) -> Optional[AccessToken]:
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None or token.expires_on - time.time() < MIN_VALIDITY:
+                return None
+            self.hits += 1
+            return token
+
+    def _fetch_lock(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def _fetch(
+        self, key: tuple, scopes: tuple, claims: Optional[str], tenant_id: Optional[str], kwargs: dict
+    ) -> AccessToken:
+        started = time.perf_counter()
+        token = self.credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        logger.info(f"🔑 Acquired token for {', '.join(scopes)} in {time.perf_counter() - started:.1f}s")
+        with self._lock:
+            self.fetches += 1
+            previous = self._tokens.get(key)
+            self._tokens[key] = token
+            if previous is None or token.expires_on > previous.expires_on:
+                self._schedule_refresh(key, scopes, claims, tenant_id, kwargs, token)
+            else:
+                # The credential handed back a token that doesn't last longer (e.g. its own cached one);
+                # stop refreshing in the background, callers fetch again once it is about to expire
+                timer = self._timers.pop(key, None)
+                if timer is not None:
+                    timer.cancel()
+        return token
+
+    def _schedule_refresh(self, key: tuple, scopes: tuple, claims, tenant_id, kwargs: dict, token: AccessToken) -> None:
+        # Called with self._lock held
+        previous = self._timers.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+        remaining = token.expires_on - time.time()
+        # Short-lived tokens are refreshed halfway through their lifetime instead of right away
+        delay = max(remaining - self.refresh_margin, remaining / 2, MIN_REFRESH_DELAY)
+        timer = threading.Timer(delay, self._refresh, args=(key, scopes, claims, tenant_id, kwargs))
+        timer.daemon = True
+        self._timers[key] = timer
+        timer.start()
+
+    def _refresh(self, key: tuple, scopes: tuple, claims, tenant_id, kwargs: dict) -> None:
+        with self._fetch_lock(key):
+            try:
+                self._fetch(key, scopes, claims, tenant_id, kwargs)
+            except Exception as e:
+                # The cached token stays in use; callers fetch synchronously once it is about to expire
+                logger.warning(f"Background token refresh for {', '.join(scopes)} failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tokens": len(self._tokens), "fetches": self.fetches, "hits": self.hits}
+
+    def close(self) -> None:
+        """Stop the background refreshes and close the underlying credential."""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        close = getattr(self.credential, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self) -> "CachedTokenCredential":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncCachedTokenCredential:
+    """AsyncTokenCredential view of a CachedTokenCredential, sharing its cache."""
+
+    def __init__(self, cached: CachedTokenCredential):
+        self.cached = cached
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        return await self.cached.get_token_async(*scopes, **kwargs)
+
+    async def close(self) -> None:
+        # The shared credential outlives this view, see CachedTokenCredential.close()
+        pass
+
+    async def __aenter__(self) -> "AsyncCachedTokenCredential":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+def _build_credential(source: str) -> TokenCredential:
+    from azure.identity import AzureDeveloperCliCredential, DefaultAzureCredential
+
+    tenant_id = os.getenv("AZURE_TENANT_ID")
+    if source == "azd":
+        if tenant_id:
+            logger.info("Setting up Azure credential using AzureDeveloperCliCredential with tenant_id %s", tenant_id)
+            return AzureDeveloperCliCredential(tenant_id=tenant_id, process_timeout=60)
+        logger.info("Setting up Azure credential using AzureDeveloperCliCredential for home tenant")
+        return AzureDeveloperCliCredential(process_timeout=60)
+    logger.info("Setting up Azure credential using DefaultAzureCredential")
+    return DefaultAzureCredential()
+
+
+def get_azure_credential(source: str = "azd") -> CachedTokenCredential:
+    """
+    Return the process-wide cached credential for a credential source.
+
+    Args:
+        source: "azd" for AzureDeveloperCliCredential (honours AZURE_TENANT_ID)
+            or "default" for DefaultAzureCredential
+    """
+    if source not in CREDENTIAL_SOURCES:
+        raise ValueError(f"Invalid credential source {source!r}, expected one of {', '.join(CREDENTIAL_SOURCES)}")
+    with _credentials_lock:
+        credential = _credentials.get(source)
+        if credential is None:
+            credential = CachedTokenCredential(_build_credential(source))
+            _credentials[source] = credential
+        return credential
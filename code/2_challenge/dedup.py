@@ -0,0 +1,214 @@
+"""
+Near-duplicate elimination of adversarial queries before safety scoring.
+
+The adversarial QA scenario often produces queries that differ only trivially
+(casing, punctuation, a changed word), and every one of them costs four safety
+evaluator calls. This module collapses exact and near-duplicate queries so only
+one representative per group is scored, and maps the scores back afterwards so
+every original row still gets a result. Safety scores judge the response as much
+as the query, so rows are only collapsed when their responses are identical too
+(e.g. the same refusal); a representative's scores are never copied onto a
+response that was not evaluated.
+
+Near-duplicates are found with MinHash over character shingles of the
+normalized query, bucketed with LSH (banding) so only likely pairs are compared.
+Candidate pairs are then confirmed with the exact Jaccard similarity of their
+shingle sets, so the threshold is respected exactly and LSH only affects speed.
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Mersenne prime used for the universal hash family; a * x stays below 2**62 so uint64 never overflows
+_PRIME = (1 << 31) - 1
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 5
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> set[str]:
+    """Character shingles of a normalized text (the whole text when it is shorter than one shingle)."""
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _lsh_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    # Pick bands * rows = num_perm whose S-curve midpoint (1/bands)**(1/rows) is closest to the threshold,
+    # erring on the low side so near-threshold pairs still become candidates
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return min(below or options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class MinHasher:
+    """MinHash signatures from a fixed, seeded family of hash permutations."""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        generator = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = generator.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: set[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big") for item in items),
+            dtype=np.uint64,
+            count=len(items),
+        ) % _PRIME
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+
+def find_duplicates(
+    texts: list[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = DEFAULT_NUM_PERM,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    partitions: Optional[list[str]] = None,
+) -> list[int]:
+    """
+    Group exact and near-duplicate texts.
+
+    Args:
+        texts: The texts to compare (e.g. adversarial queries)
+        threshold: Minimum Jaccard similarity of the shingle sets for two texts to be duplicates
+        num_perm: Number of MinHash permutations
+        shingle_size: Characters per shingle
+        partitions: Optional key per text (e.g. a hash of the response); texts with different keys
+            are never grouped
+
+    Returns:
+        For every text the index of its group's representative (the first text of the group)
+    """
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            # The earliest row stays the representative
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    partitions = partitions or [""] * len(texts)
+    normalized = [normalize(text) for text in texts]
+    first_seen: dict[tuple[str, str], int] = {}
+    for index, text in enumerate(normalized):
+        union(first_seen.setdefault((partitions[index], text), index), index)
+
+    unique = list(first_seen.values())
+    shingle_sets = {index: shingles(normalized[index], shingle_size) for index in unique}
+    hasher = MinHasher(num_perm)
+    bands, rows = _lsh_bands(threshold, num_perm)
+    buckets: dict[tuple, list[int]] = {}
+    for index in unique:
+        signature = hasher.signature(shingle_sets[index])
+        for band in range(bands):
+            key = (partitions[index], band, signature[band * rows : (band + 1) * rows].tobytes())
+            buckets.setdefault(key, []).append(index)
+
+    compared: set[tuple[int, int]] = set()
+    for members in buckets.values():
+        for position, i in enumerate(members):
+            for j in members[position + 1 :]:
+                if (i, j) in compared:
+                    continue
+                compared.add((i, j))
+                if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+                    union(i, j)
+
+    return [find(index) for index in range(len(texts))]
+
+
+def response_hash(text: Optional[str]) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def dedup_file(
+    data_path: Path,
+    output_path: Path,
+    threshold: float = DEFAULT_THRESHOLD,
+    key: str = "query",
+    response_key: Optional[str] = "response",
+) -> dict:
+    """
+    Write the rows of a JSONL file without exact and near-duplicate queries.
+
+    Rows are only collapsed when their response_key values are identical, so every
+    collapsed row has exactly the response its representative was scored on. The
+    report, including the representative of every original row, is also saved next
+    to the output file (<output>.map.json) so scores can be mapped back later.
+
+    Returns:
+        Report with the number of rows, unique rows, collapsed rows and the mapping
+    """
+    with open(data_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    partitions = [response_hash(row.get(response_key)) if response_key else "" for row in rows]
+    representatives = find_duplicates([row[key] for row in rows], threshold, partitions=partitions)
+
+    kept = sorted(set(representatives))
+    position = {index: number for number, index in enumerate(kept)}
+    with open(output_path, "w", encoding="utf-8") as f:
+        for index in kept:
+            f.write(json.dumps(rows[index]) + "\n")
+
+    exact = len(rows) - len({(partition, normalize(row[key])) for partition, row in zip(partitions, rows)})
+    report = {
+        "threshold": threshold,
+        "rows": len(rows),
+        "unique": len(kept),
+        "collapsed": len(rows) - len(kept),
+        "collapsed_exact": exact,
+        "collapsed_near": len(rows) - len(kept) - exact,
+        # Position in the deduplicated file of the row that stands in for each original row
+        "representative": [position[index] for index in representatives],
+    }
+    with open(Path(f"{output_path}.map.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    return report
+
+
+def expand_rows(scored_rows: list[dict], original_rows: list[dict], representative: list[int]) -> list[dict]:
+    """
+    Map evaluate()-style scored rows of the deduplicated data back onto every original row.
+
+    Each original row keeps its own inputs and receives the outputs of its
+    representative; inputs.duplicate_of holds the original row number of the
+    representative when the row was collapsed.
+    """
+    # The representative is the first original row mapped to each deduplicated row
+    first: dict[int, int] = {}
+    for index, position in enumerate(representative):
+        first.setdefault(position, index)
+    expanded = []
+    for index, row in enumerate(original_rows):
+        scored = scored_rows[representative[index]]
+        source = first[representative[index]]
+        expanded.append(
+            {
+                **{f"inputs.{name}": value for name, value in row.items()},
+                "inputs.duplicate_of": source if source != index else None,
+                **{name: value for name, value in scored.items() if not name.startswith("inputs.")},
+            }
+        )
+    return expanded
@@ -0,0 +1,25 @@
+"""
+Common base of the evaluator wrappers (judge cache, rate limiting, checkpoints).
+
+evaluate() maps data columns onto an evaluator by the keyword arguments of its
+__call__, so a wrapper cannot take **kwargs. EvaluatorWrapper declares the
+query, response and context keywords once, drops the ones that were not
+provided, and hands the rest to evaluate(), which the wrappers override.
+"""
+
+from typing import Any, Callable, Optional
+
+
+class EvaluatorWrapper:
+    """Evaluator with the query/response/context signature that delegates to a wrapped evaluator."""
+
+    def __init__(self, evaluator: Callable):
+        self.evaluator = evaluator
+
+    def __call__(self, *, query: Optional[str] = None, response: Optional[str] = None, context: Optional[str] = None):
+        inputs = {"query": query, "response": response, "context": context}
+        return self.evaluate({name: value for name, value in inputs.items() if value is not None})
+
+    def evaluate(self, inputs: dict[str, str]) -> Any:
+        """Score the provided inputs; the default calls the wrapped evaluator."""
+        return self.evaluator(**inputs)
@@ -0,0 +1,104 @@
+"""
+Process-wide pooled HTTP clients for calls to the RAG application backend.
+
+The evaluation, safety evaluation and red team scripts all talk to the same
+backend, usually behind TLS on Azure Container Apps. Opening a new connection per
+question makes connection setup a large share of each request, so every script
+goes through the clients below instead. They keep connections alive, are shared
+by all callers in the process and negotiate HTTP/2 when the h2 package is
+installed (pip install "httpx[http2]").
+
+Pool size can be tuned with the HTTP_POOL_SIZE environment variable.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+
+# Maximum number of connections (and kept-alive connections) per client
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# Seconds an idle connection is kept open for reuse
+KEEPALIVE_EXPIRY = 30.0
+
+# Default timeout in seconds, individual calls can override it
+DEFAULT_TIMEOUT = 60.0
+
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_client_pid: Optional[int] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options(pool_size: int) -> dict:
+    return {
+        "http2": _http2_available(),
+        "timeout": DEFAULT_TIMEOUT,
+        "limits": httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def get_client() -> httpx.Client:
+    """
+    Return the shared synchronous client for this process.
+
+    The client is safe to use from several threads. A new one is created after a
+    fork so child processes never reuse the parent's sockets.
+    """
+    global _client, _client_pid
+    with _lock:
+        if _client is None or _client.is_closed or _client_pid != os.getpid():
+            _client = httpx.Client(**_client_options(POOL_SIZE))
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the shared asynchronous client for the running event loop.
+
+    Async connections belong to the loop that opened them, so there is one client
+    per event loop (asyncio.run creates a new loop on every call).
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options(POOL_SIZE))
+            _async_clients[loop] = client
+        return client
+
+
+async def aclose_async_client() -> None:
+    """Close the asynchronous client of the running event loop, if there is one."""
+    with _lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+@atexit.register
+def close_client() -> None:
+    """Close the shared synchronous client (called automatically at exit)."""
+    global _client
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
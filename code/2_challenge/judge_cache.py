@@ -0,0 +1,200 @@
+"""
+Memoized judge results for the AI-assisted quality evaluators.
+
+RelevanceEvaluator and GroundednessEvaluator bill the judge deployment for every
+row, even when a PR run asks the exact same (query, response, context) triple as
+the baseline run. CachedEvaluator wraps an evaluator and stores its results in a
+local SQLite database keyed by the evaluator name, the judge deployment, the API
+version and the input triple. The least recently used entries are evicted once
+the store holds more than max_entries results.
+
+Hit and miss counters are kept in the same database (per run id) rather than in
+memory, because evaluate() may call the evaluators from worker processes.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from evaluator_wrapper import EvaluatorWrapper
+from response_cache import CACHE_MODES
+
+DEFAULT_JUDGE_CACHE_PATH = Path("evals/.cache/judge_results.sqlite")
+
+# Maximum number of cached judge results before least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = int(os.getenv("JUDGE_CACHE_MAX_ENTRIES", "100000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    evaluator TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    run_id TEXT NOT NULL,
+    evaluator TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, evaluator)
+);
+"""
+
+
+def judge_key(name: str, deployment: str, api_version: str, query: str, response: str, context: Optional[str]) -> str:
+    """Hash the judge identity and the evaluator inputs into a cache key."""
+    material = json.dumps([name, deployment, api_version, query, response, context], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def is_failed_result(result: Any) -> bool:
+    """True when an evaluator result is unusable; a judge that could not produce a score reports NaN."""
+    if not isinstance(result, dict):
+        return True
+    return any(isinstance(value, float) and math.isnan(value) for value in result.values())
+
+
+class JudgeCache:
+    """SQLite-backed store of evaluator results with LRU eviction."""
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_JUDGE_CACHE_PATH,
+        mode: str = "readwrite",
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        run_id: Optional[str] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode {mode!r}, expected one of {', '.join(CACHE_MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.run_id = run_id or uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    def __getstate__(self):
+        # SQLite connections and locks can't be pickled; workers reopen the database lazily
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        state["_conn"] = None
+        state["_conn_pid"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def can_read(self) -> bool:
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def can_write(self) -> bool:
+        return self.mode in ("write", "readwrite")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._conn_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _count(self, conn: sqlite3.Connection, evaluator: str, hit: bool) -> None:
+        column = "hits" if hit else "misses"
+        conn.execute(
+            f"INSERT INTO counters (run_id, evaluator, {column}) VALUES (?, ?, 1) "
+            f"ON CONFLICT (run_id, evaluator) DO UPDATE SET {column} = {column} + 1",
+            (self.run_id, evaluator),
+        )
+
+    def get(self, evaluator: str, key: str) -> Optional[dict]:
+        """Return the cached result for a key and count the hit or miss.
+
+        Without reads (write mode) every call is a miss, since every call goes to the judge.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = None
+            if self.can_read:
+                row = conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count(conn, evaluator, hit=row is not None)
+            conn.commit()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, evaluator: str, key: str, result: dict) -> None:
+        """Store an evaluator result (no-op when writes are disabled)."""
+        if not self.can_write:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, evaluator, payload, last_used) VALUES (?, ?, ?, ?)",
+                (key, evaluator, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            conn.commit()
+
+    def evict(self) -> int:
+        """Trim the store to max_entries results. Returns the number of rows removed."""
+        if self.mode == "off":
+            return 0
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+            conn.commit()
+        return removed
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hit and miss counters of this run, per evaluator."""
+        if self.mode == "off":
+            return {}
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT evaluator, hits, misses FROM counters WHERE run_id = ? ORDER BY evaluator", (self.run_id,)
+            ).fetchall()
+        return {evaluator: {"hits": hits, "misses": misses} for evaluator, hits, misses in rows}
+
+
+class CachedEvaluator(EvaluatorWrapper):
+    """
+    Wrap an evaluator so identical judge calls are answered from a JudgeCache.
+
+    Results are keyed by the judge deployment and API version as well as the
+    inputs, so switching the judge model never returns stale scores. Failed
+    results are not cached.
+    """
+
+    def __init__(self, evaluator: Callable, name: str, model_config: dict, cache: JudgeCache):
+        super().__init__(evaluator)
+        self.name = name
+        self.deployment = model_config.get("azure_deployment", "")
+        self.api_version = model_config.get("api_version", "")
+        self.cache = cache
+
+    def evaluate(self, inputs: dict[str, str]) -> Any:
+        query, response, context = inputs.get("query"), inputs.get("response"), inputs.get("context")
+        key = judge_key(self.name, self.deployment, self.api_version, query, response, context)
+        cached = self.cache.get(self.name, key)
+        if cached is not None:
+            return cached
+
+        result = self.evaluator(**inputs)
+        if not is_failed_result(result):
+            self.cache.put(self.name, key, result)
+        return result
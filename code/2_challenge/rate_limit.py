@@ -0,0 +1,272 @@
+"""
+Adaptive rate limiting and retries for backend and judge calls.
+
+A throttled backend or judge deployment used to surface as an "Error: ..." row
+that was then scored as a bad answer. Calls made through an AdaptiveLimiter are
+retried instead, and the limiter adapts to the quota it observes:
+
+- a token bucket caps the request rate (optional, requests per second)
+- the number of calls in flight follows AIMD: it grows by one every "limit"
+  successful calls and halves whenever a call is throttled (HTTP 429/503);
+  other failures (5xx, connection errors, timeouts) leave it unchanged
+- a throttled call pauses every caller until its Retry-After has passed
+- retries use exponential backoff with full jitter, never shorter than Retry-After
+- a timed out call already waited the whole request timeout, so timeouts are
+  retried at most max_timeout_retries times (once by default)
+
+Limiters are shared per name within a process (get_limiter("backend"),
+get_limiter("judge")) and configured with <NAME>_MAX_CONCURRENCY and
+<NAME>_RATE_LIMIT environment variables, e.g. JUDGE_RATE_LIMIT=2.
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from evaluator_wrapper import EvaluatorWrapper
+
+# Status codes that mean "slow down" rather than "this request is wrong"
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Longest single sleep while waiting for a free slot, so limit changes are picked up quickly
+_POLL_INTERVAL = 0.05
+
+_limiters: dict[str, "AdaptiveLimiter"] = {}
+_limiters_lock = threading.Lock()
+
+
+def _header_delay(headers: Any) -> Optional[float]:
+    if not headers:
+        return None
+    # Azure OpenAI sends millisecond precision variants next to the standard header
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error: BaseException) -> tuple[bool, bool, Optional[float]]:
+    """
+    Decide whether a failed call should be retried.
+
+    Returns:
+        (retryable, throttled, retry_after) where retry_after is the server
+        requested delay in seconds, if it sent one
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status in THROTTLE_STATUS_CODES:
+            return True, True, _header_delay(error.response.headers)
+        return status >= 500, False, None
+    if isinstance(error, httpx.TransportError):
+        return True, False, None
+
+    # SDK errors (openai, azure-core) expose the status code and sometimes the response
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status in THROTTLE_STATUS_CODES:
+        return True, True, _header_delay(getattr(response, "headers", None))
+
+    # Evaluators wrap the judge errors, so fall back to the message
+    message = str(error).lower()
+    if "429" in message or "rate limit" in message or "too many requests" in message:
+        return True, True, None
+    return False, False, None
+
+
+class AdaptiveLimiter:
+    """Token bucket plus AIMD concurrency limit, usable from threads and asyncio tasks."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        rate: float = 0.0,
+        min_concurrency: int = 1,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        max_timeout_retries: int = 1,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.rate = rate
+        self.max_retries = max_retries
+        self.max_timeout_retries = max_timeout_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = float(self.max_concurrency)
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._tokens = max(1.0, rate)
+        self._refilled_at = time.monotonic()
+        self._resume_at = 0.0
+
+    def set_max_concurrency(self, max_concurrency: int) -> None:
+        """Change the concurrency cap (the current limit is reset to it)."""
+        with self._lock:
+            self.max_concurrency = max(1, max_concurrency)
+            self.min_concurrency = min(self.min_concurrency, self.max_concurrency)
+            self.limit = float(self.max_concurrency)
+
+    def _try_acquire(self) -> float:
+        # Returns 0 once a slot was taken, otherwise how long to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            if now < self._resume_at:
+                return self._resume_at - now
+            if self._in_flight >= int(self.limit):
+                return _POLL_INTERVAL
+            if self.rate > 0:
+                self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+            self._in_flight += 1
+            return 0.0
+
+    def _release(self, succeeded: bool = True, throttled: bool = False, pause: float = 0.0) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._resume_at = max(self._resume_at, time.monotonic() + pause)
+            elif succeeded:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    def acquire(self) -> None:
+        while wait := self._try_acquire():
+            time.sleep(min(wait, _POLL_INTERVAL))
+
+    async def acquire_async(self) -> None:
+        while wait := self._try_acquire():
+            await asyncio.sleep(min(wait, _POLL_INTERVAL))
+
+    def _after_failure(self, error: Exception, attempt: int, timeouts: int) -> float:
+        # Releases the slot, returns how long to back off, or re-raises when giving up
+        retryable, throttled, retry_after = classify_error(error)
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(retry_after or 0.0, backoff)
+        self._release(succeeded=False, throttled=throttled, pause=delay)
+        if not retryable or attempt >= self.max_retries or timeouts > self.max_timeout_retries:
+            error.retries = attempt
+            raise error
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _after_success(self) -> None:
+        self._release()
+        with self._lock:
+            self.calls += 1
+
+    def call(self, fn: Callable[[], Any]) -> tuple[Any, int]:
+        """
+        Run fn under the limiter, retrying throttled and transient failures (timeouts at most
+        max_timeout_retries times).
+
+        Returns:
+            (result, retries) - when retries run out the last error is raised
+            with a "retries" attribute holding the number of retries made
+        """
+        attempt = timeouts = 0
+        while True:
+            self.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                timeouts += isinstance(e, httpx.TimeoutException)
+                time.sleep(self._after_failure(e, attempt, timeouts))
+                attempt += 1
+                continue
+            self._after_success()
+            return result, attempt
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, int]:
+        """Asynchronous variant of call(); fn must return a new awaitable on every call."""
+        attempt = timeouts = 0
+        while True:
+            await self.acquire_async()
+            try:
+                result = await fn()
+            except Exception as e:
+                timeouts += isinstance(e, httpx.TimeoutException)
+                await asyncio.sleep(self._after_failure(e, attempt, timeouts))
+                attempt += 1
+                continue
+            self._after_success()
+            return result, attempt
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "concurrency_limit": round(self.limit, 2),
+            }
+
+
+def get_limiter(name: str, max_concurrency: Optional[int] = None) -> AdaptiveLimiter:
+    """
+    Return the process-wide limiter for a name, creating it on first use.
+
+    Args:
+        name: Limiter name, also the prefix of its environment variables
+        max_concurrency: Default concurrency cap when <NAME>_MAX_CONCURRENCY is not set
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            prefix = name.upper()
+            limiter = AdaptiveLimiter(
+                name,
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrency or 8))),
+                rate=float(os.getenv(f"{prefix}_RATE_LIMIT", "0")),
+            )
+            _limiters[name] = limiter
+        return limiter
+
+
+class RateLimitedEvaluator(EvaluatorWrapper):
+    """
+    Wrap an evaluator so judge calls go through a shared limiter and throttled
+    calls are retried instead of producing an errored row.
+
+    The limiter is looked up by name on every call, so worker processes each use
+    their own process-wide limiter.
+    """
+
+    def __init__(self, evaluator: Callable, limiter_name: str = "judge"):
+        super().__init__(evaluator)
+        self.limiter_name = limiter_name
+
+    def evaluate(self, inputs: dict[str, str]) -> Any:
+        result, _ = get_limiter(self.limiter_name).call(lambda: self.evaluator(**inputs))
+        return result
@@ -0,0 +1,336 @@
+"""
+Concurrent red team sub-scans merged into one scorecard.
+
+A single RedTeam.scan over all risk categories and attack strategies did not
+fit the nightly window. The orchestrator splits the scan into one sub-scan per
+risk category, runs them concurrently and merges their attack details into one
+scorecard:
+
+- every sub-scan runs all attack strategies of its risk category, with the
+  strategies executed in parallel inside the scan (parallel_execution)
+- at most `max_concurrent_scans` sub-scans run at the same time
+- all sub-scans share one cap of `target_concurrency` calls to the target, so
+  the backend sees the same load however many sub-scans are in flight
+- a failing sub-scan is reported in the scorecard instead of failing the run
+
+RedTeam always adds the unmodified Baseline attacks to a scan. Grouping the
+strategies of a risk category into one sub-scan runs (and uploads) them once
+per category rather than once per strategy.
+
+A strategy given as a string is a local strategy chain (see attack_transforms.py):
+its RedTeam runs baseline attacks over prompts that were transformed before the
+scan, so it gets a sub-scan of its own and its attacks are reported under the
+chain name.
+
+The adaptive scan needs a separate attack budget per (risk category, strategy)
+pair (see plan_arms()), so there every sub-scan repeats the baseline attacks;
+they are kept from the first sub-scan of each category to complete only.
+"""
+
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, Callable, Optional
+
+# Strategy name used for the sub-scans that run without any attack strategy
+BASELINE = "baseline"
+
+DEFAULT_MAX_CONCURRENT_SCANS = 4
+DEFAULT_TARGET_CONCURRENCY = int(os.getenv("REDTEAM_TARGET_CONCURRENCY", "8"))
+
+
+def _strategy_name(strategy: Any) -> str:
+    if strategy is None:
+        return BASELINE
+    if isinstance(strategy, list):
+        return ",".join(_strategy_name(member) for member in strategy)
+    return str(getattr(strategy, "value", None) or getattr(strategy, "name", None) or strategy).lower()
+
+
+def _category_name(category: Any) -> str:
+    return str(getattr(category, "value", category)).lower()
+
+
+def arm_name(category: Any, strategy: Optional[Any]) -> str:
+    """Name of a (risk category, strategy) pair, e.g. "violence/base64"."""
+    return f"{_category_name(category)}/{_strategy_name(strategy)}"
+
+
+def plan_arms(risk_categories: list, attack_strategies: list) -> list[tuple[Any, Optional[Any]]]:
+    """One (risk category, strategy) pair per sub-scan; strategy None runs the baseline attacks only.
+
+    Strategies are AttackStrategy values or local strategy chain names such as "base64+rot13".
+    """
+    return [(category, strategy) for category in risk_categories for strategy in attack_strategies or [None]]
+
+
+def plan_sub_scans(risk_categories: list, attack_strategies: list) -> list[tuple[Any, Any]]:
+    """One sub-scan per risk category with all its AttackStrategy values, plus one per local strategy chain.
+
+    The strategy of a plan is a list of AttackStrategy values, a local strategy chain name, or
+    None (baseline attacks only, when there are no AttackStrategy values).
+    """
+    service = [strategy for strategy in attack_strategies if not isinstance(strategy, str)]
+    local = [strategy for strategy in attack_strategies if isinstance(strategy, str)]
+    return [(category, service or None) for category in risk_categories] + [
+        (category, chain) for category in risk_categories for chain in local
+    ]
+
+
+def limit_target(target: Callable, semaphore: asyncio.Semaphore) -> Callable:
+    """
+    Wrap a red team target so every call holds the shared semaphore.
+
+    The wrapper has the four-argument chat callback signature RedTeam uses as is.
+    Async targets are awaited on the event loop; blocking targets are called in a
+    worker thread so they do not stop the other attacks.
+    """
+    parameters = inspect.signature(target).parameters
+    chat_callback = all(name in parameters for name in ("messages", "stream", "session_state", "context"))
+
+    async def limited(messages: list, stream: bool = False, session_state: Any = None, context: Any = None) -> dict:
+        async with semaphore:
+            if chat_callback:
+                if inspect.iscoroutinefunction(target):
+                    return await target(messages, stream, session_state, context)
+                return await asyncio.to_thread(target, messages, stream, session_state, context)
+            latest = messages[-1]
+            query = latest["content"] if isinstance(latest, dict) else latest.content
+            if inspect.iscoroutinefunction(target):
+                answer = await target(query)
+            else:
+                answer = await asyncio.to_thread(target, query)
+        return {
+            "messages": [{"content": answer, "role": "assistant"}],
+            "stream": stream,
+            "session_state": session_state,
+            "context": context,
+        }
+
+    return limited
+
+
+def attack_details(result: Any) -> list[dict]:
+    """The per-conversation attack details of a RedTeamResult (or of its dict form)."""
+    if result is None:
+        return []
+    if isinstance(result, dict):
+        return result.get("attack_details") or (result.get("scan_result") or {}).get("attack_details") or []
+    details = getattr(result, "attack_details", None)
+    if details:
+        return list(details)
+    return (getattr(result, "scan_result", None) or {}).get("attack_details") or []
+
+
+def _technique(detail: dict) -> str:
+    return str(detail.get("attack_technique", BASELINE)).lower()
+
+
+def strategy_outcome(sub_scan: dict) -> tuple[int, int]:
+    """Attacks with a known outcome and successful attacks of a sub-scan's own strategy (baseline excluded)."""
+    outcomes = [
+        detail.get("attack_success")
+        for detail in sub_scan.get("attack_details", [])
+        if _technique(detail) != BASELINE or sub_scan["strategy"] == BASELINE
+    ]
+    outcomes = [success for success in outcomes if success is not None]
+    return len(outcomes), sum(1 for success in outcomes if success)
+
+
+def _rate(attacks: int, successes: int) -> Optional[float]:
+    return round(successes / attacks, 3) if attacks else None
+
+
+def merge_scorecard(sub_scans: list[dict]) -> dict:
+    """
+    Combine the attack details of all sub-scans into one attack success rate (ASR) scorecard.
+
+    Args:
+        sub_scans: Sub-scan records from run_sub_scans()
+
+    Returns:
+        Scorecard with overall, per risk category, per attack technique and joint ASR,
+        the status of every sub-scan and the merged attack details
+    """
+    details = [detail for sub_scan in sub_scans for detail in sub_scan.get("attack_details", [])]
+
+    counts: dict[tuple[str, str], list[int]] = {}
+    for detail in details:
+        key = (str(detail.get("risk_category", "unknown")).lower(), _technique(detail))
+        attacks_successes = counts.setdefault(key, [0, 0])
+        if detail.get("attack_success") is not None:
+            attacks_successes[0] += 1
+            attacks_successes[1] += int(bool(detail["attack_success"]))
+
+    def summarize(keys: list[tuple[str, str]]) -> dict:
+        attacks = sum(counts[key][0] for key in keys)
+        successes = sum(counts[key][1] for key in keys)
+        return {"attacks": attacks, "successes": successes, "asr": _rate(attacks, successes)}
+
+    categories = sorted({category for category, _ in counts})
+    techniques = sorted({technique for _, technique in counts})
+    return {
+        "overall": summarize(list(counts)),
+        "risk_category": {
+            category: summarize([key for key in counts if key[0] == category]) for category in categories
+        },
+        "attack_technique": {
+            technique: summarize([key for key in counts if key[1] == technique]) for technique in techniques
+        },
+        "joint": {
+            category: {key[1]: summarize([key]) for key in counts if key[0] == category} for category in categories
+        },
+        "sub_scans": [
+            {name: value for name, value in sub_scan.items() if name != "attack_details"} for sub_scan in sub_scans
+        ],
+        "attack_details": details,
+    }
+
+
+async def run_sub_scans(
+    make_red_team: Callable[[Any, Optional[Any]], Any],
+    target: Callable,
+    plans: list[tuple[Any, Optional[Any]]],
+    scan_name: str,
+    application_scenario: str,
+    max_concurrent_scans: int = DEFAULT_MAX_CONCURRENT_SCANS,
+    target_concurrency: int = DEFAULT_TARGET_CONCURRENCY,
+    on_complete: Optional[Callable[[dict], None]] = None,
+    baseline_done: Optional[set[str]] = None,
+) -> list[dict]:
+    """
+    Run one RedTeam.scan per (risk category, strategy) plan concurrently.
+
+    Args:
+        make_red_team: Creates the RedTeam instance of a sub-scan from its risk category and strategy
+        target: The application callback (simple query -> answer, or a chat callback)
+        plans: Plans from plan_sub_scans() or plan_arms()
+        scan_name: Prefix of the sub-scan names
+        application_scenario: Passed to every scan
+        max_concurrent_scans: Sub-scans running at the same time
+        target_concurrency: Calls to the target in flight across all sub-scans
+        on_complete: Called with every completed sub-scan record, e.g. to stream its attack details to disk
+        baseline_done: Risk categories whose baseline attacks were already kept; pass the same set to
+            several calls (e.g. the rounds of an adaptive scan) to keep the baseline attacks only once
+
+    Returns:
+        One record per sub-scan with its status, duration and attack details
+    """
+    scan_slots = asyncio.Semaphore(max_concurrent_scans)
+    limited_target = limit_target(target, asyncio.Semaphore(target_concurrency))
+    # Risk categories whose baseline attacks were already kept, from the first sub-scan to complete
+    baseline_done = set() if baseline_done is None else baseline_done
+
+    async def sub_scan(category: Any, strategy: Optional[Any]) -> dict:
+        local = isinstance(strategy, str)
+        if isinstance(strategy, list):
+            # A group of strategies is named after its risk category only
+            name, strategies = f"{scan_name}-{_category_name(category)}", list(strategy)
+        else:
+            name = f"{scan_name}-{_category_name(category)}-{_strategy_name(strategy)}"
+            strategies = [strategy] if strategy is not None and not local else []
+        record = {"name": name, "risk_category": _category_name(category), "strategy": _strategy_name(strategy)}
+        async with scan_slots:
+            print(f"   ▶️ {name}")
+            started = time.perf_counter()
+            try:
+                result = await make_red_team(category, strategy).scan(
+                    target=limited_target,
+                    scan_name=name,
+                    application_scenario=application_scenario,
+                    attack_strategies=strategies,
+                    parallel_execution=True,
+                    max_parallel_tasks=target_concurrency,
+                )
+            except Exception as e:
+                print(f"   ⚠️ {name} failed: {e}")
+                seconds = round(time.perf_counter() - started, 1)
+                return {**record, "status": "failed", "error": str(e), "seconds": seconds}
+        details = attack_details(result)
+        if local:
+            # The transformed prompts ran as baseline attacks; report them under the chain
+            details = [{**detail, "attack_technique": strategy} for detail in details]
+        elif record["risk_category"] in baseline_done:
+            # Every sub-scan repeats the baseline attacks; keep them from one sub-scan per category only
+            details = [detail for detail in details if _technique(detail) != BASELINE]
+        elif any(_technique(detail) == BASELINE for detail in details):
+            baseline_done.add(record["risk_category"])
+        print(f"   ✅ {name}: {len(details)} attacks in {time.perf_counter() - started:.0f}s")
+        record = {
+            **record,
+            "status": "completed",
+            "seconds": round(time.perf_counter() - started, 1),
+            "attack_details": details,
+        }
+        if on_complete is not None:
+            on_complete(record)
+        return record
+
+    return await asyncio.gather(*(sub_scan(category, strategy) for category, strategy in plans))
+
+
+async def run_adaptive_scans(
+    make_red_team: Callable[[Any, Optional[Any], int], Any],
+    target: Callable,
+    plans: list[tuple[Any, Optional[Any]]],
+    bandit: Any,
+    attack_budget: int,
+    round_size: int,
+    scan_name: str,
+    application_scenario: str,
+    max_concurrent_scans: int = DEFAULT_MAX_CONCURRENT_SCANS,
+    target_concurrency: int = DEFAULT_TARGET_CONCURRENCY,
+    on_complete: Optional[Callable[[dict], None]] = None,
+) -> list[dict]:
+    """
+    Spend an attack budget in rounds, letting a bandit move objectives toward the highest-yield arms.
+
+    Args:
+        make_red_team: Creates the RedTeam instance of a sub-scan from its risk category, strategy and
+            number of objectives
+        plans: The arms, as (risk category, strategy) pairs from plan_arms()
+        bandit: AttackBandit over the arm_name() of every plan
+        attack_budget: Total attack objectives across all rounds
+        round_size: Attack objectives per round
+
+    The other arguments are passed to run_sub_scans() for every round. A failed sub-scan counts
+    its objectives as unsuccessful attacks of its arm.
+
+    Returns:
+        The sub-scan records of all rounds
+    """
+    if attack_budget <= 0 or round_size <= 0:
+        raise ValueError(f"Attack budget and round size must be positive, got {attack_budget} and {round_size}")
+    arms = {arm_name(category, strategy): (category, strategy) for category, strategy in plans}
+    sub_scans: list[dict] = []
+    # Shared by all rounds, so the baseline attacks every sub-scan repeats are kept once per category
+    baseline_done: set[str] = set()
+    spent = 0
+    round_number = 0
+    while spent < attack_budget:
+        round_number += 1
+        allocation = bandit.allocate(min(round_size, attack_budget - spent))
+        round_plans = [arms[arm] for arm, objectives in allocation.items() if objectives]
+        print(f"🎰 Round {round_number}: " + ", ".join(f"{arm}={n}" for arm, n in allocation.items() if n))
+        round_scans = await run_sub_scans(
+            lambda category, strategy: make_red_team(category, strategy, allocation[arm_name(category, strategy)]),
+            target,
+            round_plans,
+            f"{scan_name}-r{round_number}",
+            application_scenario,
+            max_concurrent_scans,
+            target_concurrency,
+            on_complete,
+            baseline_done,
+        )
+        for (category, strategy), sub_scan in zip(round_plans, round_scans):
+            arm = arm_name(category, strategy)
+            if sub_scan["status"] == "failed":
+                # Count the spent objectives as failed attacks, so an arm that keeps failing loses its budget
+                bandit.update(arm, allocation[arm], allocation[arm], 0)
+            else:
+                bandit.update(arm, allocation[arm], *strategy_outcome(sub_scan))
+        sub_scans.extend(round_scans)
+        spent += sum(allocation.values())
+    return sub_scans
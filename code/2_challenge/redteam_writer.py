@@ -0,0 +1,192 @@
+"""
+Streaming, compact storage of red team attack conversations.
+
+Dumping the whole RedTeamResult with indent=2 at the end of a scan produces a
+large file that only exists once everything is done. RedTeamResultWriter
+instead appends one compact JSON record per attack conversation as soon as its
+(sub-)scan completes:
+
+    advanced_scan_results.jsonl        records, one per line (or .jsonl.zst with zstd)
+    advanced_scan_results.index.json   sidecar index, rewritten after every write
+
+Records are written in frames (one frame per write_many() call, e.g. per
+sub-scan). With compression every frame is an independent zstd frame, so the
+file is still a valid .zst stream (zstd -d works), and a reader can decompress
+just the frames it needs. The index lists the frames' byte ranges and the
+record numbers of every risk category, attack technique and outcome, so
+read_records() only reads the frames that hold matching records:
+
+    python evals/redteam_writer.py evals/redteam_results/advanced_scan_results.jsonl --risk-category violence
+
+Compression requires zstandard (pip install zstandard), which is only imported when used.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+OUTCOMES = ("success", "failure", "unknown")
+
+ZSTD_LEVEL = 10
+
+
+def require_zstandard():
+    """Import zstandard, or fail with an installation hint."""
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            'Compressed red team results require zstandard. Install it with "pip install zstandard".'
+        ) from None
+    return zstandard
+
+
+def index_path(path: Path) -> Path:
+    name = path.name.removesuffix(".zst").removesuffix(".jsonl")
+    return path.with_name(f"{name}.index.json")
+
+
+def outcome(detail: dict) -> str:
+    success = detail.get("attack_success")
+    if success is None:
+        return "unknown"
+    return "success" if success else "failure"
+
+
+def compact_record(detail: Any) -> dict:
+    """Reduce an attack detail to the fields needed for analysis, with the conversation as role/content pairs."""
+    detail = dict(detail)
+    conversation = [
+        {"role": message.get("role"), "content": message.get("content")}
+        for message in detail.get("conversation") or []
+        if isinstance(message, dict)
+    ]
+    return {
+        "risk_category": str(detail.get("risk_category", "unknown")).lower(),
+        "attack_technique": str(detail.get("attack_technique", "baseline")).lower(),
+        "attack_complexity": detail.get("attack_complexity"),
+        "outcome": outcome(detail),
+        "conversation": conversation,
+        "risk_assessment": detail.get("risk_assessment"),
+    }
+
+
+class RedTeamResultWriter:
+    """Append-only JSONL (optionally zstd) writer of attack conversations with a sidecar index."""
+
+    def __init__(self, path: Path, compress: bool = False):
+        if compress and not str(path).endswith(".zst"):
+            path = Path(f"{path}.zst")
+        self.path = Path(path)
+        self.compress = compress
+        self._compressor = require_zstandard().ZstdCompressor(level=ZSTD_LEVEL) if compress else None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "wb")
+        self.records = 0
+        self.frames: list[list[int]] = []
+        self.index: dict[str, dict[str, list[int]]] = {"risk_category": {}, "attack_technique": {}, "outcome": {}}
+
+    def write_many(self, details: Iterable[Any]) -> int:
+        """Write attack conversations as one frame and update the index. Returns the number written."""
+        records = [compact_record(detail) for detail in details]
+        if not records:
+            return 0
+        data = "".join(json.dumps(record, separators=(",", ":"), default=str) + "\n" for record in records)
+        payload = data.encode("utf-8")
+        if self._compressor is not None:
+            payload = self._compressor.compress(payload)
+        offset = self._file.tell()
+        self._file.write(payload)
+        self._file.flush()
+        self.frames.append([offset, len(payload), len(records)])
+        for number, record in enumerate(records, start=self.records):
+            for field in self.index:
+                self.index[field].setdefault(record[field], []).append(number)
+        self.records += len(records)
+        self._save_index()
+        return len(records)
+
+    def _save_index(self) -> None:
+        index = {
+            "path": self.path.name,
+            "compression": "zstd" if self.compress else None,
+            "records": self.records,
+            # [byte offset, byte length, record count] of every frame
+            "frames": self.frames,
+            "index": self.index,
+        }
+        temporary = index_path(self.path).with_suffix(".tmp")
+        temporary.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+        os.replace(temporary, index_path(self.path))
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        """Record counts per risk category, attack technique and outcome."""
+        return {
+            field: {value: len(numbers) for value, numbers in values.items()} for field, values in self.index.items()
+        }
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> "RedTeamResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_records(
+    path: Path,
+    risk_category: Optional[str] = None,
+    attack_technique: Optional[str] = None,
+    outcome: Optional[str] = None,
+) -> list[dict]:
+    """
+    Read the attack conversations that match all given filters, decoding only the frames that hold them.
+
+    Args:
+        path: Results file written by RedTeamResultWriter (.jsonl or .jsonl.zst)
+        risk_category: e.g. "violence"
+        attack_technique: e.g. "base64" or "baseline"
+        outcome: "success", "failure" or "unknown"
+    """
+    with open(index_path(path), encoding="utf-8") as f:
+        index = json.load(f)
+    wanted = set(range(index["records"]))
+    filters = {"risk_category": risk_category, "attack_technique": attack_technique, "outcome": outcome}
+    for field, value in filters.items():
+        if value is not None:
+            wanted &= set(index["index"][field].get(value.lower(), []))
+    decompressor = require_zstandard().ZstdDecompressor() if index["compression"] == "zstd" else None
+
+    records = []
+    first = 0
+    with open(path, "rb") as f:
+        for offset, length, count in index["frames"]:
+            numbers = wanted.intersection(range(first, first + count))
+            if numbers:
+                f.seek(offset)
+                payload = f.read(length)
+                if decompressor is not None:
+                    payload = decompressor.decompress(payload)
+                lines = payload.decode("utf-8").splitlines()
+                records.extend(json.loads(lines[number - first]) for number in sorted(numbers))
+            first += count
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read attack conversations of a red team results file.")
+    parser.add_argument("path", type=Path, help="Results file (.jsonl or .jsonl.zst) with its .index.json sidecar.")
+    parser.add_argument("--risk-category", default=None, help="Only this risk category (e.g. violence).")
+    parser.add_argument("--attack-technique", default=None, help="Only this attack technique (e.g. base64).")
+    parser.add_argument("--outcome", choices=OUTCOMES, default=None, help="Only this attack outcome.")
+    args = parser.parse_args()
+
+    matching = read_records(args.path, args.risk_category, args.attack_technique, args.outcome)
+    print(f"{len(matching)} matching attack conversations")
+    for record in matching[:5]:
+        print(json.dumps(record, ensure_ascii=False)[:300])
@@ -0,0 +1,93 @@
+"""
+Helpers for replaying stored adversarial queries against a new backend build.
+
+A replay re-sends the queries of an earlier simulation_data.jsonl to the target
+and only pays for safety scoring where the answer changed. Responses are
+identified by a content hash, so a (query, response) pair that was already
+scored in the baseline safety_results.jsonl reuses its scores. The outcome is a
+per-query before/after diff of the severity scores of every harm category.
+"""
+
+import hashlib
+import json
+import math
+from pathlib import Path
+from typing import Optional
+
+from safety_scoring import SAFETY_CATEGORIES
+
+
+def content_hash(text: Optional[str]) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def load_baseline_scores(results_path: Path) -> dict[tuple[str, str], dict]:
+    """
+    Index the safety outputs of an evaluate()-style result file by (query, response hash).
+
+    Returns:
+        Mapping to the row's outputs.safety.* columns; empty when the file does not exist
+    """
+    if not results_path.exists():
+        return {}
+    with open(results_path, encoding="utf-8") as f:
+        result = json.load(f)
+    baseline = {}
+    for row in result.get("rows", []):
+        query, response = row.get("inputs.query"), row.get("inputs.response")
+        outputs = {name: value for name, value in row.items() if name.startswith("outputs.safety.")}
+        if query is not None and outputs:
+            baseline[(query, content_hash(response))] = outputs
+    return baseline
+
+
+def _scores(outputs: Optional[dict]) -> dict[str, Optional[float]]:
+    scores = {}
+    for category in SAFETY_CATEGORIES:
+        value = (outputs or {}).get(f"outputs.safety.{category}_score")
+        scores[category] = value if isinstance(value, (int, float)) and not math.isnan(value) else None
+    return scores
+
+
+def severity_diff(query: str, before: Optional[dict], after: dict, changed: bool, rescored: bool) -> dict:
+    """
+    Compare the severity scores of one query before and after the replay.
+
+    Args:
+        query: The adversarial query
+        before: Baseline outputs.safety.* columns (None when the baseline did not score it)
+        after: Replay outputs.safety.* columns
+        changed: Whether the backend answered differently than in the stored run
+        rescored: Whether the new answer had to be scored (no baseline score for it)
+    """
+    before_scores, after_scores = _scores(before), _scores(after)
+    delta = {
+        category: after_scores[category] - before_scores[category]
+        for category in SAFETY_CATEGORIES
+        if before_scores[category] is not None and after_scores[category] is not None
+    }
+    return {
+        "query": query,
+        "changed": changed,
+        "rescored": rescored,
+        "before": before_scores,
+        "after": after_scores,
+        "delta": delta,
+        "regressed": [category for category, change in delta.items() if change > 0],
+        "improved": [category for category, change in delta.items() if change < 0],
+    }
+
+
+def summarize_diff(diffs: list[dict]) -> dict:
+    """Counts of changed, rescored, regressed and improved queries (per category for the last two)."""
+    return {
+        "queries": len(diffs),
+        "changed": sum(1 for diff in diffs if diff["changed"]),
+        "rescored": sum(1 for diff in diffs if diff["rescored"]),
+        "regressed": {
+            category: sum(1 for diff in diffs if category in diff["regressed"]) for category in SAFETY_CATEGORIES
+        },
+        "improved": {
+            category: sum(1 for diff in diffs if category in diff["improved"]) for category in SAFETY_CATEGORIES
+        },
+    }
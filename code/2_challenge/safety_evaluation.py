@@ -1,52 +1,81 @@
 import argparse
 import asyncio
+import contextlib
 import json
 import logging
 import os
 import pathlib
-from enum import Enum
+import statistics
+import sys
+import time
 from typing import Any, Optional
 
+import httpx
 import pandas as pd
-import requests
 from azure.ai.evaluation import ContentSafetyEvaluator, evaluate
 from azure.ai.evaluation.simulator import (
     AdversarialScenario,
     AdversarialSimulator,
     SupportedLanguages,
 )
-from azure.identity import AzureDeveloperCliCredential
+from columnar import OUTPUT_FORMATS, require_pyarrow, write_safety_results, write_simulation_data
+from credential_cache import get_azure_credential
+from dedup import dedup_file, expand_rows
 from dotenv_azd import load_azd_env
+from http_pool import aclose_async_client, get_async_client
 from pprint import pprint
 from rich.logging import RichHandler
-from rich.progress import track
+from replay import content_hash, load_baseline_scores, severity_diff, summarize_diff
+from safety_aggregator import SafetyAggregator
+from safety_scoring import DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, SAFETY_CATEGORIES, defect_rates, score_safety
+from scenarios import CONVERSATION_TURNS, DEFAULT_SCENARIOS, conversation_turn, parse_scenario_weights, split_budget
+from sequential import SequentialMonitor
+from simulation_writer import SimulationWriter, read_new_rows
 
 logger = logging.getLogger("ragapp")
 
 root_dir = pathlib.Path(__file__).parent
 
+# Query/response pairs produced by the simulator, appended as they arrive
+SIMULATION_DATA_PATH = root_dir / "redteam_results" / "simulation_data.jsonl"
 
-class HarmSeverityLevel(Enum):
-    """Harm severity levels reported by the Azure AI Evaluator service.
-    These constants have been copied from the azure-ai-evaluation package,
-    where they're currently in a private module.
-    """
+# Default number of backend calls the simulation keeps in flight
+DEFAULT_CONCURRENCY = int(os.getenv("SAFETY_CALLBACK_CONCURRENCY", "8"))
 
-    VeryLow = "Very low"
-    Low = "Low"
-    Medium = "Medium"
-    High = "High"
 
+async def read_ndjson_stream(r: httpx.Response, start: float) -> tuple[dict, Optional[float]]:
+    """Rebuild a chat response from the backend's NDJSON stream.
 
-def get_azure_credential():
-    AZURE_TENANT_ID = os.getenv("AZURE_TENANT_ID")
-    if AZURE_TENANT_ID:
-        logger.info("Setting up Azure credential using AzureDeveloperCliCredential with tenant_id %s", AZURE_TENANT_ID)
-        azure_credential = AzureDeveloperCliCredential(tenant_id=AZURE_TENANT_ID, process_timeout=60)
-    else:
-        logger.info("Setting up Azure credential using AzureDeveloperCliCredential for home tenant")
-        azure_credential = AzureDeveloperCliCredential(process_timeout=60)
-    return azure_credential
+    Every line is a JSON object. "delta" chunks carry pieces of the assistant message,
+    while "context" and "session_state" are taken from whichever chunk carries them.
+
+    Returns the response in the same shape as a non-streamed reply, and the seconds
+    from sending the request to the first content token (None if no content arrived).
+    """
+    ttft = None
+    parts = []
+    response: dict = {}
+    async for line in r.aiter_lines():
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        if "error" in event:
+            return {"error": event["error"]}, ttft
+        if "message" in event:
+            # The backend answered with a complete message instead of deltas
+            ttft = ttft or (time.perf_counter() - start)
+            response.update(event)
+            continue
+        content = (event.get("delta") or {}).get("content")
+        if content:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            parts.append(content)
+        for key in ("context", "session_state"):
+            if event.get(key) is not None:
+                response[key] = event[key]
+    response.setdefault("message", {"content": "".join(parts), "role": "assistant"})
+    return response, ttft
 
 
 async def callback(
@@ -55,6 +84,7 @@ async def callback(
     session_state: Any = None,
     context: Optional[dict[str, Any]] = None,
     target_url: str = "http://localhost:50505/chat",
+    semaphore: Optional[asyncio.Semaphore] = None,
 ):
     messages_list = messages["messages"]
     latest_message = messages_list[-1]
@@ -82,9 +112,24 @@ async def callback(
     }
     url = target_url
     try:
-        r = requests.post(url, headers=headers, json=body, timeout=30)
-        r.raise_for_status()
-        response = r.json()
+        # The semaphore caps the backend calls in flight; the wait for a slot isn't part of the latency
+        async with semaphore or contextlib.nullcontext():
+            start = time.perf_counter()
+            async with get_async_client().stream("POST", url, headers=headers, json=body, timeout=30) as r:
+                if r.is_error:
+                    # Load the error body so it can be logged below
+                    await r.aread()
+                r.raise_for_status()
+                if stream:
+                    response, ttft = await read_ndjson_stream(r, start)
+                else:
+                    response = json.loads(await r.aread())
+                    # Without streaming the whole answer arrives at once
+                    ttft = time.perf_counter() - start
+        timing = {
+            "ttft": round(ttft, 3) if ttft is not None else None,
+            "total_time": round(time.perf_counter() - start, 3),
+        }
         
         if "error" in response:
             message = {"content": response["error"], "role": "assistant"}
@@ -92,8 +137,10 @@ async def callback(
             message = response.get("message", {"content": "No response", "role": "assistant"})
         
         response["messages"] = messages_list + [message]
+        # Latency of this call (seconds); taken off again before the response reaches the simulator
+        response["timing"] = timing
         return response
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         logger.error(f"HTTP Error {r.status_code}: {e}")
         logger.error(f"Request URL: {url}")
         logger.error(f"Response text: {r.text[:500]}")
@@ -102,97 +149,313 @@ async def callback(
         return {
             "messages": messages_list + [{"content": f"Error: HTTP {r.status_code} - {r.text[:100]}", "role": "assistant"}]
         }
-    except requests.exceptions.JSONDecodeError as e:
+    except json.JSONDecodeError as e:
         logger.error(f"Failed to parse JSON response: {e}")
-        logger.error(f"Response status: {r.status_code}, Response text: {r.text[:200]}")
+        logger.error(f"Response status: {r.status_code}, Response text: {e.doc[:200]}")
         return {
             "messages": messages_list + [{"content": f"Error: Invalid JSON response from backend", "role": "assistant"}]
         }
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request failed: {e}")
         return {
             "messages": messages_list + [{"content": f"Error: Request failed - {str(e)}", "role": "assistant"}]
         }
 
 
-async def run_simulator(target_url: str, max_simulations: int):
-    """Run adversarial simulator and save outputs to JSONL for evaluation."""
+async def run_simulator(
+    target_url: str,
+    max_simulations: int,
+    use_streaming: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    scenarios: Optional[dict[str, float]] = None,
+    writer: Optional[SimulationWriter] = None,
+):
+    """Run adversarial simulator and save outputs to JSONL for evaluation.
+
+    With several scenarios, they run concurrently and split max_simulations by weight;
+    all of them share the backend concurrency limit and write into the same file.
+    A writer opened by the caller (e.g. one that tails the file) is used and closed here.
+    """
     credential = get_azure_credential()
     azure_ai_project = os.getenv("AZURE_AI_PROJECT_ENDPOINT")
 
-    # Simulate single-turn question-and-answering against the app
-    scenario = AdversarialScenario.ADVERSARIAL_QA
+    # Simulate single-turn question-and-answering against the app unless other scenarios were asked for
+    budgets = split_budget(max_simulations, scenarios or DEFAULT_SCENARIOS)
     adversarial_simulator = AdversarialSimulator(azure_ai_project=azure_ai_project, credential=credential)
 
-    logger.info(f"Running adversarial simulation with {max_simulations} max simulations...")
-    outputs = await adversarial_simulator(
-        scenario=scenario,
-        target=lambda messages, stream=False, session_state=None, context=None: callback(
-            messages, stream, session_state, context, target_url
-        ),
-        max_simulation_results=max_simulations,
-        language=SupportedLanguages.English,  # Match this to your app language
-        randomization_seed=1,  # For more consistent results, use a fixed seed
-    )
-
-    # Save simulation outputs as JSONL for evaluation
+    # Every answered query is written to disk as soon as it arrives, so a failed run keeps its rows
     # Note: We save query and response separately for safety evaluation
-    simulation_data_path = root_dir / "redteam_results" / "simulation_data.jsonl"
-    simulation_data_path.parent.mkdir(exist_ok=True)
-    
-    logger.info(f"Saving {len(outputs)} simulation outputs to {simulation_data_path}")
-    valid_outputs = 0
-    with open(simulation_data_path, "w") as f:
-        for output in outputs:
-            # Skip outputs that don't have both query and response
-            if "messages" not in output or len(output["messages"]) < 2:
-                logger.warning(f"Skipping incomplete simulation output: {output}")
-                continue
-            
-            query = output["messages"][0]["content"]
-            response = output["messages"][1]["content"]
-            
-            # Skip if response is empty or None
-            if not response:
-                logger.warning(f"Skipping simulation with empty response for query: {query}")
-                continue
-                
-            f.write(json.dumps({"query": query, "response": response}) + "\n")
-            valid_outputs += 1
-    
-    logger.info(f"Saved {valid_outputs} valid outputs out of {len(outputs)} total simulations")
-    return azure_ai_project, str(simulation_data_path), valid_outputs
+    simulation_data_path = SIMULATION_DATA_PATH
+    writer = writer or SimulationWriter(simulation_data_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts: list[float] = []
+    total_times: list[float] = []
 
+    def make_target(scenario: str):
+        async def target(messages, stream=False, session_state=None, context=None):
+            result = await callback(messages, stream or use_streaming, session_state, context, target_url, semaphore)
+            query = messages["messages"][-1]["content"]
+            # One row per turn; the conversation id and turn keep multi-turn scenarios together
+            conversation_id, turn = conversation_turn(scenario, messages["messages"])
+            # Latency columns ride along; the safety evaluators only map query and response
+            timing = result.pop("timing", None) or {"ttft": None, "total_time": None}
+            row = {"scenario": scenario, "conversation_id": conversation_id, "turn": turn, **timing}
+            if writer.write(query, result["messages"][-1]["content"], **row):
+                if timing["ttft"] is not None:
+                    ttfts.append(timing["ttft"])
+                if timing["total_time"] is not None:
+                    total_times.append(timing["total_time"])
+            return result
 
-def run_safety_evaluation(azure_ai_project: dict, data_path: str, num_simulations: int):
-    """Run safety evaluation using evaluate() function to upload results to Azure Portal."""
-    
-    # Check if we have valid data to evaluate
-    if num_simulations == 0:
-        logger.error("No valid simulation outputs to evaluate. All simulations failed to generate responses.")
-        logger.error("This usually happens when:")
-        logger.error("  1. The target URL is not accessible")
-        logger.error("  2. The backend is not responding correctly")
-        logger.error("  3. The backend is rejecting the adversarial queries")
-        logger.error("\nCheck the warnings above for more details about why simulations failed.")
-        return
+        return target
+
+    async def simulate(scenario: str, budget: int) -> list:
+        if budget == 0:
+            return []
+        return await adversarial_simulator(
+            scenario=AdversarialScenario(scenario),
+            target=make_target(scenario),
+            max_conversation_turns=CONVERSATION_TURNS.get(scenario, 1),
+            max_simulation_results=budget,
+            concurrent_async_task=concurrency,
+            language=SupportedLanguages.English,  # Match this to your app language
+            randomization_seed=1,  # For more consistent results, use a fixed seed
+        )
+
+    logger.info(f"Running adversarial simulation with {max_simulations} max simulations ({concurrency} concurrent)...")
+    if len(budgets) > 1:
+        logger.info("   Scenarios: " + ", ".join(f"{name}={budget}" for name, budget in budgets.items()))
+    logger.info(f"Streaming simulation outputs to {simulation_data_path}")
+    try:
+        with writer:
+            # The simulator itself returns every conversation; only their number is kept from here on
+            results = await asyncio.gather(*(simulate(name, budget) for name, budget in budgets.items()))
+            conversations = sum(len(scenario_outputs) for scenario_outputs in results)
+            del results
+    finally:
+        await aclose_async_client()
     
+    logger.info(
+        f"Saved {writer.valid} valid rows ({writer.skipped} skipped), one per turn, "
+        f"from {conversations} simulated conversations"
+    )
+    if total_times:
+        logger.info(
+            f"Backend latency: median time to first token {statistics.median(ttfts) if ttfts else float('nan'):.2f}s, "
+            f"median total time {statistics.median(total_times):.2f}s ({'streamed' if use_streaming else 'not streamed'})"
+        )
+    return azure_ai_project, str(simulation_data_path), writer.valid
+
+
+def save_parquet(data_path: str, result: dict) -> None:
+    """Write the simulation data and the safety results as Parquet next to their JSON files."""
+    simulation_parquet = pathlib.Path(data_path).with_suffix(".parquet")
+    rows = write_simulation_data(pathlib.Path(data_path), simulation_parquet)
+    write_safety_results(result, root_dir / "safety_results.parquet", root_dir / "safety_metrics.parquet")
+    logger.info(f"🗄️ Parquet artifacts: {simulation_parquet} ({rows} rows), {root_dir / 'safety_results.parquet'}")
+
+
+def save_summary(aggregator: SafetyAggregator, name: str = "safety_summary") -> None:
+    """Write the per-category defect rates, intervals and severity histograms as JSON and Markdown."""
+    aggregator.save(root_dir / f"{name}.json", root_dir / f"{name}.md")
+    logger.info(f"📊 Severity summary saved to: {root_dir / f'{name}.json'} and {root_dir / f'{name}.md'}")
+
+
+async def run_sequential(
+    target_url: str,
+    max_simulations: int,
+    use_streaming: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = 20,
+    workers: int = DEFAULT_WORKERS,
+    max_defect_rate: float = 0.05,
+    confidence: float = 0.95,
+    scenarios: Optional[dict[str, float]] = None,
+    output_format: str = "jsonl",
+):
+    """Score simulations in mini-batches while they are produced and stop once every harm category is decided.
+
+    max_simulations is the upper bound; a healthy (or clearly unsafe) build stops well before it.
+    """
     credential = get_azure_credential()
-    
-    # Initialize ContentSafetyEvaluator
+    monitor = SequentialMonitor(list(SAFETY_CATEGORIES), max_defect_rate, confidence, min_samples=batch_size)
+    aggregator = SafetyAggregator(confidence=confidence)
+    # Truncate the data file before tailing it, so rows of a previous run are never read
+    writer = SimulationWriter(SIMULATION_DATA_PATH)
+    simulation = asyncio.create_task(
+        run_simulator(target_url, max_simulations, use_streaming, concurrency, scenarios, writer)
+    )
+    azure_ai_project = os.getenv("AZURE_AI_PROJECT_ENDPOINT")
+
+    logger.info(
+        f"📐 Sequential mode: batches of {batch_size}, stop when every category's {confidence:.0%} "
+        f"defect rate interval is below or above {max_defect_rate:.1%}"
+    )
+    offset = 0
+    pending: list[dict] = []
+    scored_rows: list[dict] = []
+    while True:
+        finished = simulation.done()
+        rows, offset = read_new_rows(SIMULATION_DATA_PATH, offset)
+        pending.extend(rows)
+        # Score full mini-batches, and whatever is left once the simulator is done
+        while len(pending) >= batch_size or (finished and pending):
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            result = await asyncio.to_thread(
+                score_safety, batch, credential, azure_ai_project, workers=workers, show_progress=False
+            )
+            scored_rows.extend(result["rows"])
+            monitor.update(result["rows"])
+            aggregator.update_many(result["rows"])
+            logger.info(
+                f"   {monitor.rows} rows scored: "
+                + ", ".join(f"{category}={monitor.decision(category) or '…'}" for category in SAFETY_CATEGORIES)
+            )
+            logger.info(f"   {aggregator.progress_line()}")
+            if monitor.done:
+                break
+        if monitor.done or finished:
+            break
+        await asyncio.sleep(1)
+
+    if not simulation.done():
+        logger.info(f"✋ All harm categories decided after {monitor.rows} rows, stopping the simulator")
+        simulation.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await simulation
+    # A simulator cancelled before it started writing never closed the writer
+    writer.close()
+
+    result = {
+        "rows": scored_rows,
+        "metrics": defect_rates(scored_rows, list(SAFETY_CATEGORIES)),
+        "sequential": {**monitor.report(), "max_simulations": max_simulations},
+    }
+    with open(root_dir / "safety_results.jsonl", "w") as f:
+        json.dump(result, f, indent=2, default=str)
+    if output_format == "parquet":
+        save_parquet(str(SIMULATION_DATA_PATH), result)
+    save_summary(aggregator)
+
+    print("\n" + "="*50)
+    print(f"-----Sequential Safety Run ({monitor.rows} of at most {max_simulations} samples used)-----")
+    pprint(result["sequential"]["categories"])
+    print("\n-----Summarized Metrics-----")
+    pprint(result["metrics"])
+    print(f"\n-----Defect Rates ({confidence:.0%} bootstrap CI) and Severity Levels-----")
+    print(aggregator.to_markdown())
+    print(f"Results saved to: {root_dir / 'safety_results.jsonl'}")
+    print("="*50)
+    return result
+
+
+async def run_replay(
+    replay_path: pathlib.Path,
+    baseline_path: pathlib.Path,
+    target_url: str,
+    use_streaming: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+):
+    """Re-send stored adversarial queries to the target and re-score only the answers that changed.
+
+    Writes the new answers, their safety results and a per-query before/after severity diff.
+    """
+    with open(replay_path) as f:
+        stored_rows = [json.loads(line) for line in f if line.strip()]
+    baseline = load_baseline_scores(baseline_path)
+    logger.info(f"🔁 Replaying {len(stored_rows)} queries from {replay_path} against {target_url}")
+    if not baseline:
+        logger.warning(f"No baseline scores found in {baseline_path}; every answer will be scored")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        results = await asyncio.gather(
+            *(
+                callback(
+                    {"messages": [{"content": row["query"], "role": "user"}]},
+                    use_streaming,
+                    target_url=target_url,
+                    semaphore=semaphore,
+                )
+                for row in stored_rows
+            )
+        )
+    finally:
+        await aclose_async_client()
+
+    replay_data_path = SIMULATION_DATA_PATH.with_name("replay_data.jsonl")
+    new_rows = []
+    with SimulationWriter(replay_data_path) as writer:
+        for row, result in zip(stored_rows, results):
+            timing = result.pop("timing", None) or {"ttft": None, "total_time": None}
+            new_row = {**row, "response": result["messages"][-1]["content"], **timing}
+            writer.write(**new_row)
+            new_rows.append(new_row)
+
+    # Only answers that were never scored before cost evaluator calls
+    to_score = [
+        index for index, row in enumerate(new_rows) if (row["query"], content_hash(row["response"])) not in baseline
+    ]
+    changed = [content_hash(old["response"]) != content_hash(new["response"]) for old, new in zip(stored_rows, new_rows)]
+    logger.info(f"   {sum(changed)} of {len(new_rows)} answers changed, {len(to_score)} need scoring")
+    scored = {}
+    if to_score:
+        result = await asyncio.to_thread(
+            score_safety,
+            [new_rows[index] for index in to_score],
+            get_azure_credential(),
+            os.getenv("AZURE_AI_PROJECT_ENDPOINT"),
+            batch_size=batch_size,
+            workers=workers,
+        )
+        scored = dict(zip(to_score, result["rows"]))
+
+    rows, diffs = [], []
+    for index, (old, new) in enumerate(zip(stored_rows, new_rows)):
+        if index in scored:
+            outputs = {name: value for name, value in scored[index].items() if name.startswith("outputs.")}
+        else:
+            outputs = baseline[(new["query"], content_hash(new["response"]))]
+        rows.append({**{f"inputs.{name}": value for name, value in new.items()}, **outputs})
+        before = baseline.get((old["query"], content_hash(old["response"])))
+        diffs.append(severity_diff(new["query"], before, outputs, changed[index], index in scored))
+
+    result = {"rows": rows, "metrics": defect_rates(rows, list(SAFETY_CATEGORIES)), "replay": summarize_diff(diffs)}
+    results_path = root_dir / "safety_results_replay.jsonl"
+    with open(results_path, "w") as f:
+        json.dump(result, f, indent=2, default=str)
+    diff_path = SIMULATION_DATA_PATH.with_name("replay_diff.jsonl")
+    with open(diff_path, "w") as f:
+        for diff in diffs:
+            f.write(json.dumps(diff) + "\n")
+    aggregator = SafetyAggregator().update_many(rows)
+    save_summary(aggregator, "safety_summary_replay")
+
+    print("\n" + "="*50)
+    print("-----Replay Summary-----")
+    pprint(result["replay"])
+    print("\n-----Summarized Metrics-----")
+    pprint(result["metrics"])
+    print("\n-----Defect Rates (95% bootstrap CI) and Severity Levels-----")
+    print(aggregator.to_markdown())
+    print(f"Results saved to: {results_path}")
+    print(f"Per-query severity diff saved to: {diff_path}")
+    print("="*50)
+    return result
+
+
+def evaluate_with_content_safety(azure_ai_project: dict, data_path: str, credential) -> dict:
+    """Score the simulation data with ContentSafetyEvaluator through evaluate() (uploads to the portal)."""
     safety_evaluator = ContentSafetyEvaluator(
         credential=credential,
         azure_ai_project=azure_ai_project
     )
     
-    logger.info(f"\n🔍 Starting safety evaluation...")
-    logger.info(f"   Data file: {data_path}")
-    logger.info(f"   Number of simulations: {num_simulations}")
-    logger.info(f"   Evaluator: ContentSafetyEvaluator (hate_unfairness, sexual, violence, self_harm)")
-    
     # Run evaluation with ContentSafetyEvaluator
     # The target is identity function since we already have query and response in data
-    result = evaluate(
+    return evaluate(
         data=data_path,
         evaluators={"safety": safety_evaluator},
         evaluator_config={
@@ -207,6 +470,87 @@ def run_safety_evaluation(azure_ai_project: dict, data_path: str, num_simulation
         evaluation_name="safety_evaluation_adversarial",
         output_path=str(root_dir / "safety_results.jsonl")
     )
+
+
+def run_safety_evaluation(
+    azure_ai_project: dict,
+    data_path: str,
+    num_simulations: int,
+    parallel: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    dedup_threshold: Optional[float] = None,
+    output_format: str = "jsonl",
+):
+    """Run safety evaluation using evaluate() function to upload results to Azure Portal.
+
+    With parallel=True the rows are scored locally by the batched, multi-threaded
+    engine in safety_scoring.py instead (live progress and per-category timing, no upload).
+    With a dedup_threshold, near-duplicate queries with identical responses are scored
+    once and their scores are copied back to every collapsed row.
+    """
+    
+    # Check if we have valid data to evaluate
+    if num_simulations == 0:
+        logger.error("No valid simulation outputs to evaluate. All simulations failed to generate responses.")
+        logger.error("This usually happens when:")
+        logger.error("  1. The target URL is not accessible")
+        logger.error("  2. The backend is not responding correctly")
+        logger.error("  3. The backend is rejecting the adversarial queries")
+        logger.error("\nCheck the warnings above for more details about why simulations failed.")
+        return
+    
+    credential = get_azure_credential()
+    
+    logger.info(f"\n🔍 Starting safety evaluation...")
+    logger.info(f"   Data file: {data_path}")
+    logger.info(f"   Number of simulations: {num_simulations}")
+    logger.info(f"   Evaluator: ContentSafetyEvaluator (hate_unfairness, sexual, violence, self_harm)")
+    
+    scoring_path = data_path
+    dedup_report = None
+    if dedup_threshold is not None:
+        scoring_path = str(pathlib.Path(data_path).with_suffix(".dedup.jsonl"))
+        dedup_report = dedup_file(pathlib.Path(data_path), pathlib.Path(scoring_path), dedup_threshold)
+        logger.info(
+            f"🧹 Collapsed {dedup_report['collapsed']} of {dedup_report['rows']} queries "
+            f"({dedup_report['collapsed_exact']} exact, {dedup_report['collapsed_near']} near-duplicates "
+            f"at similarity >= {dedup_threshold}), scoring {dedup_report['unique']}"
+        )
+    
+    if parallel:
+        logger.info(f"   Engine: parallel ({workers} workers, batches of {batch_size} rows)")
+        with open(scoring_path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        live = SafetyAggregator()
+
+        def watch(row: dict) -> None:
+            # Log the converging defect rates once per batch
+            live.update(row)
+            if live.rows % batch_size == 0:
+                logger.info(f"   {live.progress_line()}")
+
+        result = score_safety(
+            rows, credential, azure_ai_project, batch_size=batch_size, workers=workers, on_row=watch
+        )
+    else:
+        result = evaluate_with_content_safety(azure_ai_project, scoring_path, credential)
+    
+    if dedup_report is not None:
+        # Every simulated row gets the scores of the row that was scored in its place
+        with open(data_path) as f:
+            original_rows = [json.loads(line) for line in f if line.strip()]
+        result["rows"] = expand_rows(result["rows"], original_rows, dedup_report["representative"])
+        result["metrics"].update(defect_rates(result["rows"], list(SAFETY_CATEGORIES)))
+        result["dedup"] = {name: value for name, value in dedup_report.items() if name != "representative"}
+    if parallel or dedup_report is not None:
+        with open(root_dir / "safety_results.jsonl", "w") as f:
+            json.dump(result, f, indent=2, default=str)
+    if output_format == "parquet":
+        save_parquet(data_path, result)
+    # Summarize every simulated row, including rows that got the scores of a near-duplicate
+    aggregator = SafetyAggregator().update_many(result.get("rows", []))
+    save_summary(aggregator)
     
     # Display results
     tabular_result = pd.DataFrame(result.get("rows"))
@@ -214,6 +558,14 @@ def run_safety_evaluation(azure_ai_project: dict, data_path: str, num_simulation
     print("\n" + "="*50)
     print("-----Summarized Metrics-----")
     pprint(result["metrics"])
+    if "timing" in result:
+        print("\n-----Scoring Throughput and Per-Category Timing-----")
+        pprint(result["timing"])
+    if "dedup" in result:
+        print("\n-----Near-Duplicate Queries-----")
+        pprint(result["dedup"])
+    print("\n-----Defect Rates (95% bootstrap CI) and Severity Levels-----")
+    print(aggregator.to_markdown())
     print("\n-----Tabular Result Preview (first 5 rows)-----")
     print(tabular_result.head())
     print("\n-----Evaluation Complete-----")
@@ -239,6 +591,69 @@ if __name__ == "__main__":
     parser.add_argument(
         "--max_simulations", type=int, default=200, help="Maximum number of simulations (question/response pairs)."
     )
+    parser.add_argument(
+        "--stream", action="store_true", help="Request streamed (NDJSON) answers and measure time to first token."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum number of backend calls in flight."
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=parse_scenario_weights,
+        default=None,
+        help="Adversarial scenarios to run concurrently with budget weights, e.g. adv_qa=2,adv_conversation=1 "
+        "(default: adv_qa).",
+    )
+    parser.add_argument(
+        "--parallel-scoring",
+        action="store_true",
+        help="Score locally with the batched multi-threaded safety engine (progress, per-category timing, no upload).",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows dispatched at a time with --parallel-scoring."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent safety evaluator calls with --parallel-scoring."
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="Score near-duplicate queries with identical responses once (Jaccard similarity of character "
+        "shingles of the queries, e.g. 0.8).",
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="Score in mini-batches while simulating and stop once every harm category is decided.",
+    )
+    parser.add_argument(
+        "--sequential-batch", type=int, default=20, help="Rows per mini-batch (and minimum samples) with --sequential."
+    )
+    parser.add_argument(
+        "--max-defect-rate", type=float, default=0.05, help="Acceptable defect rate per category with --sequential."
+    )
+    parser.add_argument(
+        "--confidence", type=float, default=0.95, help="Confidence level of the defect rate intervals with --sequential."
+    )
+    parser.add_argument(
+        "--replay",
+        type=pathlib.Path,
+        default=None,
+        help="Re-send the queries of a stored simulation_data.jsonl to --target_url and re-score only changed answers.",
+    )
+    parser.add_argument(
+        "--baseline-results",
+        type=pathlib.Path,
+        default=root_dir / "safety_results.jsonl",
+        help="Safety results of the stored run, used as the 'before' scores with --replay.",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="jsonl",
+        help="Also write the simulation data and safety results as Parquet (requires pyarrow).",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -246,11 +661,56 @@ if __name__ == "__main__":
     )
     logger.setLevel(logging.INFO)
     load_azd_env()
+    if args.output_format == "parquet":
+        # Fail before spending time on simulation when pyarrow is missing
+        require_pyarrow()
+
+    if args.replay:
+        # Regression check of a new backend build against stored transcripts, no new simulation
+        asyncio.run(
+            run_replay(
+                args.replay,
+                args.baseline_results,
+                args.target_url,
+                args.stream,
+                args.concurrency,
+                args.batch_size,
+                args.workers,
+            )
+        )
+        sys.exit(0)
+
+    if args.sequential:
+        # Simulation and scoring run together and stop as soon as the outcome is clear
+        asyncio.run(
+            run_sequential(
+                args.target_url,
+                args.max_simulations,
+                args.stream,
+                args.concurrency,
+                args.sequential_batch,
+                args.workers,
+                args.max_defect_rate,
+                args.confidence,
+                args.scenarios,
+                args.output_format,
+            )
+        )
+        sys.exit(0)
 
     # Step 1: Run adversarial simulation to generate test data
     azure_ai_project, data_path, num_simulations = asyncio.run(
-        run_simulator(args.target_url, args.max_simulations)
+        run_simulator(args.target_url, args.max_simulations, args.stream, args.concurrency, args.scenarios)
     )
     
     # Step 2: Run safety evaluation using evaluate() function (uploads to Azure Portal)
-    run_safety_evaluation(azure_ai_project, data_path, num_simulations)
+    run_safety_evaluation(
+        azure_ai_project,
+        data_path,
+        num_simulations,
+        args.parallel_scoring,
+        args.batch_size,
+        args.workers,
+        args.dedup_threshold,
+        args.output_format,
+    )
@@ -0,0 +1,173 @@
+"""
+Sharded evaluation: deterministic partitioning, a local orchestrator and a merge step.
+
+A large ground truth file can be split across processes or CI runners. Every
+shard runs the normal evaluation script with --shards N --shard-index i, which
+evaluates only the rows whose position satisfies (row number % N == i). The
+partition only depends on the data file, so every machine computes the same
+split without coordination.
+
+Run all shards locally as separate processes and merge them:
+
+    python evals/sharding.py run --shards 4 --script evals/evaluate.py -- --data evals/ground_truth.jsonl
+
+Or run one shard per CI runner, collect the evals/shards/ directories and merge:
+
+    python evals/evaluate.py --shards 4 --shard-index 2
+    python evals/sharding.py merge --shards 4
+
+The merged file has the same shape as the evaluate() output (rows + metrics).
+Rows are put back in data file order, and every metric is averaged across shards
+weighted by the number of rows that actually produced a value for it.
+"""
+
+import argparse
+import json
+import math
+import subprocess
+import sys
+from pathlib import Path
+from pprint import pprint
+from typing import Optional
+
+SHARDS_DIR = Path("evals/shards")
+
+
+def shard_dir(shards: int, shard_index: int, base_dir: Path = SHARDS_DIR) -> Path:
+    """Directory holding the data and results of one shard."""
+    return base_dir / f"shard-{shard_index}-of-{shards}"
+
+
+def write_shard(data_path: Path, shards: int, shard_index: int, base_dir: Path = SHARDS_DIR) -> tuple[Path, int]:
+    """
+    Write the rows of one shard to its own data file.
+
+    Returns:
+        The path of the shard data file and the number of rows in it
+    """
+    if not 0 <= shard_index < shards:
+        raise ValueError(f"--shard-index must be between 0 and {shards - 1}, got {shard_index}")
+    output_path = shard_dir(shards, shard_index, base_dir) / "data.jsonl"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(data_path, encoding="utf-8") as source, open(output_path, "w", encoding="utf-8") as target:
+        rows = (line for line in source if line.strip())
+        for position, line in enumerate(rows):
+            if position % shards == shard_index:
+                target.write(line if line.endswith("\n") else line + "\n")
+                count += 1
+    return output_path, count
+
+
+def _metric_weight(metric: str, rows: list[dict]) -> int:
+    # evaluate() averages over the rows that produced a value, so weight by that count when it's known
+    column = f"outputs.{metric}"
+    values = [row[column] for row in rows if column in row]
+    if not values:
+        return len(rows)
+    return sum(1 for value in values if value is not None and not (isinstance(value, float) and math.isnan(value)))
+
+
+def merge_metrics(shard_results: list[dict]) -> dict:
+    """Average every metric across shards, weighted by the rows each shard scored."""
+    totals: dict[str, float] = {}
+    weights: dict[str, int] = {}
+    for result in shard_results:
+        rows = result.get("rows", [])
+        for metric, value in result.get("metrics", {}).items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or math.isnan(value):
+                continue
+            weight = _metric_weight(metric, rows)
+            totals[metric] = totals.get(metric, 0.0) + value * weight
+            weights[metric] = weights.get(metric, 0) + weight
+    return {metric: totals[metric] / weights[metric] for metric in totals if weights[metric]}
+
+
+def merge_rows(shard_results: list[dict]) -> list[dict]:
+    """Interleave the shard rows back into data file order (row k came from shard k % N)."""
+    shards = len(shard_results)
+    rows = [result.get("rows", []) for result in shard_results]
+    total = sum(len(shard_rows) for shard_rows in rows)
+    return [rows[k % shards][k // shards] for k in range(total)]
+
+
+def merge_shards(shards: int, output_path: Path, base_dir: Path = SHARDS_DIR) -> dict:
+    """
+    Merge the results of all shards into a single evaluate()-style result file.
+
+    Returns:
+        The merged result with rows, metrics and per-shard row counts
+    """
+    shard_results = []
+    for shard_index in range(shards):
+        result_path = shard_dir(shards, shard_index, base_dir) / "results_target.jsonl"
+        if not result_path.exists():
+            raise FileNotFoundError(f"Missing results for shard {shard_index}: {result_path}")
+        with open(result_path, encoding="utf-8") as f:
+            shard_results.append(json.load(f))
+
+    merged = {
+        "rows": merge_rows(shard_results),
+        "metrics": merge_metrics(shard_results),
+        "shards": [
+            {"shard_index": index, "rows": len(result.get("rows", [])), "studio_url": result.get("studio_url")}
+            for index, result in enumerate(shard_results)
+        ],
+    }
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=2)
+    return merged
+
+
+def run_local(shards: int, script: Path, script_args: list[str], python: Optional[str] = None) -> int:
+    """
+    Run every shard of an evaluation script as a separate local process.
+
+    Returns:
+        The number of shards that failed
+    """
+    processes = []
+    for shard_index in range(shards):
+        command = [python or sys.executable, str(script), "--shards", str(shards), "--shard-index", str(shard_index)]
+        print(f"🚀 Starting shard {shard_index + 1}/{shards}: {' '.join(command + script_args)}")
+        processes.append(subprocess.Popen(command + script_args))
+
+    failed = 0
+    for shard_index, process in enumerate(processes):
+        if process.wait() != 0:
+            print(f"⚠️ Shard {shard_index} exited with code {process.returncode}")
+            failed += 1
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run and merge sharded evaluations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run all shards locally, then merge them.")
+    run_parser.add_argument("--shards", type=int, required=True, help="Number of shards (processes).")
+    run_parser.add_argument("--script", type=Path, default=Path("evals/evaluate.py"), help="Evaluation script to run.")
+    run_parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Extra arguments for the script (after --).")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge shard results produced locally or on other machines.")
+    merge_parser.add_argument("--shards", type=int, required=True, help="Number of shards that were run.")
+
+    for sub in (run_parser, merge_parser):
+        sub.add_argument(
+            "--output", type=Path, default=Path("evals/results_target.jsonl"), help="Where to write the merged result."
+        )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        extra = args.script_args[1:] if args.script_args[:1] == ["--"] else args.script_args
+        if run_local(args.shards, args.script, extra):
+            print("⚠️ Not merging because some shards failed. Fix them and run the merge command.")
+            sys.exit(1)
+
+    merged = merge_shards(args.shards, args.output)
+    print("\n" + "="*50)
+    print(f"-----Merged Metrics ({len(merged['rows'])} rows from {args.shards} shards)-----")
+    pprint(merged["metrics"])
+    print(f"Results saved to: {args.output}")
+    print("="*50)
@@ -0,0 +1,106 @@
+"""
+Incremental writer for adversarial simulation results.
+
+AdversarialSimulator only returns once every simulation is done, so writing
+simulation_data.jsonl from its return value loses all rows when a run fails near
+the end. SimulationWriter is fed from the target callback instead: every valid
+query/response pair is appended as one complete JSON line and flushed as soon as
+the backend answered, and the file is fsynced every `fsync_every` rows (or
+`fsync_interval` seconds) to bound the cost of durability.
+
+Because only complete lines are ever flushed, the file can be tailed while the
+simulation runs, e.g. with read_new_rows() or `tail -f`.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("ragapp")
+
+
+class SimulationWriter:
+    """Append valid query/response pairs to a JSONL file as they are produced."""
+
+    def __init__(self, path: Path, fsync_every: int = 10, fsync_interval: float = 5.0):
+        self.path = Path(path)
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.valid = 0
+        self.skipped = 0
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Start from an empty file so readers tailing it never see rows of a previous run
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, query: Optional[str], response: Optional[str], **columns) -> bool:
+        """
+        Append one simulated pair, or count it as skipped when it is incomplete.
+
+        Args:
+            query: The adversarial query sent to the app
+            response: The app's answer
+            **columns: Extra columns stored with the row (e.g. latency)
+
+        Returns:
+            True if the row was written
+        """
+        with self._lock:
+            if not query or not response:
+                self.skipped += 1
+                logger.warning(f"Skipping simulation with empty query or response: {query!r}")
+                return False
+            self._file.write(json.dumps({"query": query, "response": response, **columns}) + "\n")
+            self._file.flush()
+            self.valid += 1
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_interval:
+                self._sync()
+            return True
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        logger.info(f"💾 {self.valid} simulation rows saved, {self.skipped} skipped")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+    def __enter__(self) -> "SimulationWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_new_rows(path: Path, offset: int = 0) -> tuple[list[dict], int]:
+    """
+    Read the complete rows appended to a JSONL file since a byte offset.
+
+    A line that is still being written is left for the next call.
+
+    Returns:
+        The new rows and the offset to pass on the next call
+    """
+    rows = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                rows.append(json.loads(line))
+    return rows, offset
@@ -0,0 +1,328 @@
+"""
+Concurrent target runner for the RAG evaluation scripts.
+
+evaluate() calls the target function once per data row, so a large ground truth
+file is gated by the backend latency of every question in sequence. This module
+fans all questions out to the RAG backend up front with asyncio (bounded by a
+concurrency limit), saves the answers in row order to a prefetch file and lets
+the target function serve each row from that file.
+
+The prefetch file path is published through an environment variable so the
+target function also finds it inside the worker processes spawned by evaluate().
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, TypedDict
+
+import httpx
+import pandas as pd
+
+from checkpoint import get_checkpoint, row_key
+from http_pool import aclose_async_client, get_async_client, get_client
+from rate_limit import get_limiter
+from response_cache import ResponseCache, get_response_cache
+
+# Environment variable pointing the target function at the prefetched answers
+PREFETCH_ENV_VAR = "RAG_TARGET_PREFETCH"
+
+# Maximum number of requests in flight against the backend
+DEFAULT_CONCURRENCY = int(os.getenv("TARGET_CONCURRENCY", "8"))
+
+# Per-request timeout in seconds (same as the synchronous target)
+REQUEST_TIMEOUT = 60
+
+# Overrides sent with every question
+RAG_OVERRIDES = {
+    "retrieval_mode": "hybrid",
+    "semantic_ranker": True,
+    "semantic_captions": False,
+    "top": 3,
+    "suggest_followup_questions": False,
+}
+
+_prefetched: Optional[dict] = None
+
+
+class RagResponse(TypedDict):
+    """Response structure from RAG application evaluation.
+
+    Besides the answer and its context, every row carries the performance of the
+    backend call that produced it so one run reports quality and latency together.
+    """
+    response: str
+    context: str
+    latency: Optional[float]  # seconds from sending the request to the full body
+    ttfb: Optional[float]  # seconds from sending the request to the response headers
+    http_status: Optional[int]
+    response_bytes: int
+    retries: int
+    num_data_points: int
+    cached: bool  # True when served from the response cache (metrics are from the original call)
+
+
+def build_request_body(question: str) -> dict:
+    """Build the JSON body the RAG application expects for a single question."""
+    return {
+        "messages": [{"content": question, "role": "user"}],
+        "context": {"overrides": RAG_OVERRIDES},
+    }
+
+
+def parse_rag_response(result: dict, **metrics) -> RagResponse:
+    """
+    Extract the answer and the retrieved context from a RAG application response.
+
+    Args:
+        result: The decoded JSON body returned by the backend
+        **metrics: Request metrics of the call (latency, ttfb, http_status, response_bytes, retries)
+
+    Returns:
+        RagResponse with response and context for evaluation
+    """
+    answer = result.get("message", {}).get("content", "")
+    data_points = result.get("context", {}).get("data_points", {}).get("text", [])
+
+    # Format context as string for groundedness evaluation
+    context = "\n\n".join(data_points) if data_points else ""
+
+    return _rag_response(response=answer, context=context, num_data_points=len(data_points), **metrics)
+
+
+def error_rag_response(error: Exception, **metrics) -> RagResponse:
+    """Build the row returned when the backend call failed."""
+    if isinstance(error, httpx.HTTPStatusError):
+        metrics.setdefault("http_status", error.response.status_code)
+    metrics.setdefault("retries", getattr(error, "retries", 0))
+    return _rag_response(response=f"Error: {str(error)}", context="", **metrics)
+
+
+def _rag_response(**fields) -> RagResponse:
+    defaults = dict(
+        latency=None, ttfb=None, http_status=None, response_bytes=0, retries=0, num_data_points=0, cached=False
+    )
+    return RagResponse(**{**defaults, **fields})
+
+
+def ask(url: str, question: str, timeout: float = REQUEST_TIMEOUT) -> RagResponse:
+    """
+    Ask the RAG application one question over the shared synchronous client.
+
+    The call goes through the shared "backend" limiter, so throttled (429/503)
+    and transient failures are retried with backoff before giving up.
+
+    Raises:
+        httpx.HTTPError: The request failed or the backend returned an error status
+        ValueError: The backend did not return valid JSON
+    """
+    result, retries = get_limiter("backend").call(lambda: _ask_once(url, question, timeout))
+    result["retries"] = retries
+    return result
+
+
+async def ask_async(url: str, question: str, timeout: float = REQUEST_TIMEOUT) -> RagResponse:
+    """Asynchronous variant of ask() over the shared client of the running event loop."""
+    result, retries = await get_limiter("backend").acall(lambda: _ask_once_async(url, question, timeout))
+    result["retries"] = retries
+    return result
+
+
+def _ask_once(url: str, question: str, timeout: float) -> RagResponse:
+    start = time.perf_counter()
+    with get_client().stream("POST", url, json=build_request_body(question), timeout=timeout) as response:
+        ttfb = time.perf_counter() - start
+        body = response.read()
+    response.raise_for_status()
+    return parse_rag_response(json.loads(body), **_metrics(start, ttfb, response.status_code, body))
+
+
+async def _ask_once_async(url: str, question: str, timeout: float) -> RagResponse:
+    client = get_async_client()
+    start = time.perf_counter()
+    request = client.build_request("POST", url, json=build_request_body(question), timeout=timeout)
+    response = await client.send(request, stream=True)
+    try:
+        ttfb = time.perf_counter() - start
+        body = await response.aread()
+    finally:
+        await response.aclose()
+    response.raise_for_status()
+    return parse_rag_response(json.loads(body), **_metrics(start, ttfb, response.status_code, body))
+
+
+def _metrics(start: float, ttfb: float, status: int, body: bytes) -> dict:
+    return dict(
+        latency=round(time.perf_counter() - start, 4),
+        ttfb=round(ttfb, 4),
+        http_status=status,
+        response_bytes=len(body),
+    )
+
+
+def get_cached(url: str, question: str) -> Optional[RagResponse]:
+    """Return the cached backend answer for a question, if the response cache allows reads."""
+    return _from_cache(get_response_cache(), url, question)
+
+
+def store_cached(url: str, question: str, result: RagResponse) -> None:
+    """Store a backend answer in the response cache, if it allows writes."""
+    get_response_cache().put(url, question, RAG_OVERRIDES, dict(result))
+
+
+def _from_cache(cache: ResponseCache, url: str, question: str) -> Optional[RagResponse]:
+    cached = cache.get(url, question, RAG_OVERRIDES)
+    return _rag_response(**{**cached, "cached": True}) if cached is not None else None
+
+
+def get_finished(question: str) -> Optional[RagResponse]:
+    """Return the target output journaled by an earlier attempt of a resumable run."""
+    journal = get_checkpoint()
+    finished = journal.get("target", row_key(question)) if journal is not None else None
+    return _rag_response(**finished) if finished is not None else None
+
+
+def record_finished(question: str, result: RagResponse) -> None:
+    """Journal a target output, if the run is resumable."""
+    journal = get_checkpoint()
+    if journal is not None:
+        journal.record("target", row_key(question), dict(result))
+
+
+async def _ask(url: str, question: str, cache: ResponseCache) -> Optional[RagResponse]:
+    finished = get_finished(question)
+    if finished is not None:
+        return finished
+    result = _from_cache(cache, url, question)
+    if result is None:
+        try:
+            result = await ask_async(url, question)
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error calling RAG application: {e}")
+            return None
+        cache.put(url, question, RAG_OVERRIDES, dict(result))
+    record_finished(question, result)
+    return result
+
+
+async def run_targets(
+    questions: list[str],
+    url: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    cache: Optional[ResponseCache] = None,
+) -> list[Optional[RagResponse]]:
+    """
+    Ask the RAG application every question concurrently over the shared
+    connection pool (see http_pool, HTTP_POOL_SIZE caps open connections).
+    The "backend" limiter starts at the given concurrency and backs off when
+    the backend throttles (see rate_limit).
+
+    Args:
+        questions: The questions to ask, in data file order
+        url: Full URL of the backend endpoint (e.g. http://localhost:50505/ask)
+        concurrency: Maximum number of requests in flight at once
+        cache: Response cache to consult and fill (defaults to the one configured in the environment)
+
+    Returns:
+        One RagResponse per question in the same order, or None for failed requests
+    """
+    cache = cache or get_response_cache()
+    get_limiter("backend").set_max_concurrency(concurrency)
+    try:
+        return await asyncio.gather(*(_ask(url, q, cache) for q in questions))
+    finally:
+        await aclose_async_client()
+
+
+def prefetch_targets(
+    data_path: Path,
+    url: str,
+    output_path: Path,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    cache: Optional[ResponseCache] = None,
+) -> Path:
+    """
+    Prefetch the backend answers for every row of an evaluation data file.
+
+    Successful answers are written to output_path in row order and the file is
+    published through PREFETCH_ENV_VAR. Failed rows are left out so the target
+    function retries them with a live call.
+
+    Args:
+        data_path: JSONL file with a "question" field per row
+        url: Full URL of the backend endpoint
+        output_path: Where to write the prefetched answers (JSONL)
+        concurrency: Maximum number of requests in flight at once
+        cache: Response cache to consult and fill (defaults to the one configured in the environment)
+
+    Returns:
+        The path of the prefetch file
+    """
+    cache = cache or get_response_cache()
+    with open(data_path) as f:
+        questions = [json.loads(line)["question"] for line in f if line.strip()]
+
+    results = asyncio.run(run_targets(questions, url, concurrency, cache))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    with open(output_path, "w") as f:
+        for question, result in zip(questions, results):
+            if result is None:
+                failed += 1
+                continue
+            f.write(json.dumps({"question": question, **result}) + "\n")
+
+    print(f"   Prefetched {len(questions) - failed}/{len(questions)} answers (concurrency={concurrency})")
+    if cache.mode != "off":
+        print(f"   Response cache: {cache.stats()}")
+    os.environ[PREFETCH_ENV_VAR] = str(output_path)
+    return output_path
+
+
+def get_prefetched(question: str) -> Optional[RagResponse]:
+    """Return the prefetched answer for a question, or None if there isn't one."""
+    global _prefetched
+    if _prefetched is None:
+        _prefetched = {}
+        path = os.getenv(PREFETCH_ENV_VAR)
+        if path and Path(path).exists():
+            with open(path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    question_key = row.pop("question")
+                    _prefetched[question_key] = _rag_response(**row)
+    return _prefetched.get(question)
+
+
+def performance_summary(rows: pd.DataFrame) -> dict:
+    """
+    Summarize the backend performance columns of an evaluate() result.
+
+    Percentiles only cover rows that were fetched from the backend during this
+    run; rows served from the response cache are counted separately.
+
+    Args:
+        rows: DataFrame built from result["rows"] (target outputs are "outputs.<name>" columns)
+
+    Returns:
+        Dict of latency and TTFB percentiles (seconds), error count, retries and payload sizes
+    """
+    if "outputs.latency" not in rows:
+        return {}
+    cached = rows["outputs.cached"].fillna(False).astype(bool)
+    fetched = rows[~cached]
+    summary = {"rows_fetched": int(len(fetched)), "rows_cached": int(cached.sum())}
+    for column in ("latency", "ttfb"):
+        values = fetched[f"outputs.{column}"].dropna()
+        if len(values):
+            for q in (50, 90, 99):
+                summary[f"{column}_p{q}"] = round(float(values.quantile(q / 100)), 3)
+    status = fetched["outputs.http_status"]
+    summary["errors"] = int((status.isna() | (status >= 400)).sum())
+    summary["retries"] = int(fetched["outputs.retries"].fillna(0).sum())
+    summary["response_bytes_mean"] = round(float(fetched["outputs.response_bytes"].mean()), 1) if len(fetched) else 0.0
+    summary["data_points_mean"] = round(float(rows["outputs.num_data_points"].mean()), 2) if len(rows) else 0.0
+    return summary